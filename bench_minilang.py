@@ -0,0 +1,83 @@
+import contextlib
+import io
+import time
+
+from minilang import Interpreter
+
+PROGRAM = """
+x = 5 + 3
+y = x * 2
+z = y - x
+w = z / 3
+if x > 5 :
+    y = y + 1
+else :
+    y = y - 1
+max x y z w
+""" * 20
+
+LOOP_PROGRAM = """
+total = 0
+for i in range 1000000 :
+    if i > 500000 :
+        total = total + 1
+"""
+
+BATCH_PROGRAM = """
+y = x * 3
+if y > 100 :
+    z = y / 7
+else :
+    z = y - 1
+"""
+
+
+def run_per_row(xs):
+    for x in xs:
+        interpreter = Interpreter()
+        interpreter.variables['x'] = x
+        interpreter.run(BATCH_PROGRAM)
+
+
+def run_line_by_line(interpreter: Interpreter, program: str):
+    # Ancien chemin : chaque ligne est re-tokenisée à chaque exécution
+    lines = program.splitlines()
+    i = 0
+    while i < len(lines):
+        result = interpreter.execute_line(lines[i])
+        if result == 'if_true':
+            i += 1
+            interpreter.execute_line(lines[i].strip())
+            i += 1
+        elif result == 'if_false':
+            i += 2
+        else:
+            i += 1
+
+
+def bench(name: str, func, repeat: int = 2000):
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        elapsed = time.perf_counter() - t0
+    print(f"{name:<20} {elapsed:.3f}s ({repeat / elapsed:.0f} runs/s)")
+    return elapsed
+
+
+if __name__ == "__main__":
+    line_by_line = bench("line by line", lambda: run_line_by_line(Interpreter(), PROGRAM))
+    compiled = bench("compiled", lambda: Interpreter().run(PROGRAM))
+    print(f"speedup: x{line_by_line / compiled:.1f}")
+    bench("1M iterations loop", lambda: Interpreter().run(LOOP_PROGRAM), repeat=1)
+    bench("profiled loop", lambda: Interpreter(profile=True).run(LOOP_PROGRAM), repeat=1)
+
+    try:
+        import numpy as np
+    except ImportError:
+        print("numpy not installed, skipping batch benchmark")
+    else:
+        xs = np.arange(100_000)
+        per_row = bench("100k rows per row", lambda: run_per_row(xs.tolist()), repeat=1)
+        batch = bench("100k rows batch", lambda: Interpreter().run_batch(BATCH_PROGRAM, {'x': xs}), repeat=1)
+        print(f"speedup: x{per_row / batch:.1f}")
@@ -1,3 +1,30 @@
+import contextlib
+import functools
+import multiprocessing
+import queue
+import signal
+import sys
+import threading
+import time
+from collections import defaultdict
+from operator import add, sub, mul, gt, lt, eq, ne, ge, le
+
+try:
+    import numpy as np
+except ImportError:  # numpy n'est nécessaire que pour Interpreter.run_batch
+    np = None
+
+
+def divide(left, right):
+    """Division entière, qui renvoie un message plutôt que de lever une exception."""
+    return left // right if right != 0 else 'Division par zéro'
+
+
+# Tables symbole -> fonction, partagées par les opérateurs et le bytecode
+MATH_FUNCTIONS = {'+': add, '-': sub, '*': mul, '/': divide}
+COMPARISON_FUNCTIONS = {'>': gt, '<': lt, '==': eq, '!=': ne, '>=': ge, '<=': le}
+
+
 class Operator:
     """Superclasse représentant un opérateur générique."""
     def apply(self, left, right):
@@ -9,15 +36,7 @@ class MathOperator(Operator):
         self.symbol = symbol
 
     def apply(self, left, right):
-        match self.symbol:
-            case '+':
-                return left + right
-            case '-':
-                return left - right
-            case '*':
-                return left * right
-            case '/':
-                return left // right if right != 0 else 'Division par zéro'
+        return MATH_FUNCTIONS[self.symbol](left, right)
 
     def __repr__(self):
         return f"MathOperator('{self.symbol}')"
@@ -28,19 +47,7 @@ class ComparisonOperator(Operator):
         self.symbol = symbol
 
     def apply(self, left, right):
-        match self.symbol:
-            case '>':
-                return left > right
-            case '<':
-                return left < right
-            case '==':
-                return left == right
-            case '!=':
-                return left != right
-            case '>=':
-                return left >= right
-            case '<=':
-                return left <= right
+        return COMPARISON_FUNCTIONS[self.symbol](left, right)
 
     def __repr__(self):
         return f"ComparisonOperator('{self.symbol}')"
@@ -51,11 +58,12 @@ class Func:
         self.name = name
         self.args = args
 
-    def execute(self):
+    def execute(self, output=None):
         match self.name:
             case 'print':
+                write = output.write if output is not None else print
                 for arg in self.args:
-                    print(arg)
+                    write(arg)
             case 'max':
                 return max(self.args)
             case 'min':
@@ -64,20 +72,509 @@ class Func:
     def __repr__(self):
         return f"Func('{self.name}', {self.args})"
 
+class Op:
+    """Codes d'instruction du bytecode."""
+    STORE = 0          # (STORE, var, fonction, gauche, droite)
+    PRINT = 1          # (PRINT, opérande)
+    CALL = 2           # (CALL, fonction, opérandes)
+    JUMP_IF_FALSE = 3  # (JUMP_IF_FALSE, fonction, gauche, droite, cible)
+    JUMP = 4           # (JUMP, cible)
+    SET = 5            # (SET, var, opérande)
+    JUMP_IF_TRUE = 6   # (JUMP_IF_TRUE, fonction, gauche, droite, cible)
+
+CALL_FUNCTIONS = {'max': max, 'min': min}
+
+# Type d'opérateur de chaque instruction, pour le profilage
+OPCODE_KINDS = {
+    Op.STORE: 'MathOperator', Op.JUMP_IF_FALSE: 'ComparisonOperator', Op.JUMP_IF_TRUE: 'ComparisonOperator',
+    Op.PRINT: 'Func', Op.CALL: 'Func', Op.SET: 'Assign', Op.JUMP: 'Jump',
+}
+
+
+def batch_divide(left, right):
+    """Version vectorisée de divide : les divisions par zéro donnent le même message, ligne par ligne."""
+    left, right = np.broadcast_arrays(left, right)
+    zero = right == 0
+    if not zero.any():
+        return left // right
+    result = (left // np.where(zero, 1, right)).astype(object)
+    result[zero] = 'Division par zéro'
+    return result
+
+
+def batch_reduce(ufunc):
+    """max/min en mode batch : réduction élément par élément entre les arguments."""
+    return lambda args: functools.reduce(ufunc, args)
+
+
+def batch_functions() -> dict:
+    # Les opérateurs Python s'appliquent déjà élément par élément sur les tableaux numpy
+    return {divide: batch_divide, max: batch_reduce(np.maximum), min: batch_reduce(np.minimum)}
+
+
+class Code:
+    """
+    Programme compilé : une suite d'instructions prêtes à être exécutées.
+    Chaque opérande est un indice dans un tableau de slots, dont le modèle
+    initial (frame) contient les constantes et, pour chaque variable, son
+    propre nom : une variable jamais affectée vaut son nom, comme dans get_value.
+    linenos donne la ligne de chaque instruction dans le programme complet, dont
+    source ne contient que les lignes first_lineno et suivantes.
+    """
+    def __init__(self, instructions, slots: dict[str, int], frame, linenos=(), source=(), first_lineno: int = 1):
+        self.instructions = tuple(instructions)
+        self.slots = slots
+        self.frame = tuple(frame)
+        self.linenos = tuple(linenos)
+        self.source = tuple(source)
+        self.first_lineno = first_lineno
+
+    def source_line(self, lineno: int) -> str:
+        return self.source[lineno - self.first_lineno]
+
+    def __len__(self):
+        return len(self.instructions)
+
+    def __repr__(self):
+        return f"Code({len(self.instructions)} instructions)"
+
+
+def is_integer(token: str) -> bool:
+    """Indique si un token est un entier littéral, sans passer par une exception."""
+    digits = token[1:] if token[:1] in ('+', '-') else token
+    return digits.isdecimal()
+
+
+def compile_operand(token):
+    """Résout un token une fois pour toutes : (False, constante) ou (True, nom de variable)."""
+    if is_integer(token):
+        return False, int(token)
+    return True, token
+
+
+def compile_line(tokens):
+    """Traduit les tokens d'une ligne simple en instruction, ou None si la ligne ne fait rien."""
+    match tokens:
+        case [var, '=', left, symbol, right] if symbol in MATH_FUNCTIONS:
+            return Op.STORE, var, MATH_FUNCTIONS[symbol], compile_operand(left), compile_operand(right)
+        case [var, '=', value]:
+            return Op.SET, var, compile_operand(value)
+        case ['print', var]:
+            return Op.PRINT, compile_operand(var)
+        case [func_name, *args] if func_name in CALL_FUNCTIONS:
+            return Op.CALL, CALL_FUNCTIONS[func_name], tuple(compile_operand(arg) for arg in args)
+    return None
+
+
+class Compiler:
+    """
+    Traduit un programme en bytecode. Les blocs sont délimités par l'indentation
+    et les branchements sont résolus en sauts vers des positions absolues.
+    first_lineno est le numéro de la première ligne de program, quand il n'est
+    qu'un morceau d'un programme plus long (run_stream).
+    """
+    def __init__(self, program: str, first_lineno: int = 1):
+        # (indentation, tokens, numéro de ligne) pour chaque ligne non vide
+        self.source = tuple(program.splitlines())
+        self.first_lineno = first_lineno
+        self.lines = [(len(line) - len(line.lstrip()), tokens, lineno)
+                      for lineno, line in enumerate(self.source, first_lineno) if (tokens := line.split())]
+        self.pos = 0
+        self.instructions = []
+        # Ligne source de chaque instruction, pour le profilage
+        self.linenos = []
+        self.lineno = 0
+
+    def compile(self) -> Code:
+        self.block(-1)
+        self.fold_constants()
+        self.remove_dead_stores()
+        return self.assemble()
+
+    def emit(self, *instruction) -> int:
+        self.instructions.append(instruction)
+        self.linenos.append(self.lineno)
+        return len(self.instructions) - 1
+
+    def patch(self, index: int):
+        """Fait pointer le saut à la position index vers la prochaine instruction émise."""
+        self.instructions[index] = self.instructions[index][:-1] + (len(self.instructions),)
+
+    def block(self, parent_indent: int):
+        # Un bloc regroupe toutes les lignes plus indentées que son en-tête
+        while self.pos < len(self.lines) and self.lines[self.pos][0] > parent_indent:
+            self.statement()
+
+    def statement(self):
+        indent, tokens, lineno = self.lines[self.pos]
+        self.pos += 1
+        self.lineno = lineno
+        match tokens:
+            case ['if', left, op, right, ':'] if op in COMPARISON_FUNCTIONS:
+                jump = self.emit(Op.JUMP_IF_FALSE, COMPARISON_FUNCTIONS[op],
+                                 compile_operand(left), compile_operand(right), None)
+                self.block(indent)
+                if self.pos < len(self.lines) and self.lines[self.pos][:2] == (indent, ['else', ':']):
+                    self.lineno = self.lines[self.pos][2]
+                    self.pos += 1
+                    skip = self.emit(Op.JUMP, None)
+                    self.patch(jump)
+                    self.block(indent)
+                    self.patch(skip)
+                else:
+                    self.patch(jump)
+
+            # La condition est placée après le corps : un seul saut par itération
+            case ['while', left, op, right, ':'] if op in COMPARISON_FUNCTIONS:
+                jump = self.emit(Op.JUMP, None)
+                body = len(self.instructions)
+                self.block(indent)
+                self.patch(jump)
+                self.lineno = lineno
+                self.emit(Op.JUMP_IF_TRUE, COMPARISON_FUNCTIONS[op],
+                          compile_operand(left), compile_operand(right), body)
+
+            # for i in range [start] stop : la borne stop est réévaluée à chaque tour
+            case ['for', var, 'in', 'range', *bounds, ':'] if len(bounds) in (1, 2):
+                start, stop = bounds if len(bounds) == 2 else ('0', bounds[0])
+                self.emit(Op.SET, var, compile_operand(start))
+                jump = self.emit(Op.JUMP, None)
+                body = len(self.instructions)
+                self.block(indent)
+                self.lineno = lineno
+                self.emit(Op.STORE, var, add, compile_operand(var), compile_operand('1'))
+                self.patch(jump)
+                self.emit(Op.JUMP_IF_TRUE, lt, compile_operand(var), compile_operand(stop), body)
+
+            case _:
+                instruction = compile_line(tokens)
+                if instruction is not None:
+                    self.emit(*instruction)
+
+    def fold_constants(self):
+        """Calcule à la compilation les opérations et conditions dont les deux opérandes sont constants."""
+        for i, instruction in enumerate(self.instructions):
+            match instruction:
+                case (Op.STORE, var, func, (False, left), (False, right)):
+                    self.instructions[i] = Op.SET, var, (False, func(left, right))
+                case (Op.JUMP_IF_FALSE | Op.JUMP_IF_TRUE as op, func, (False, left), (False, right), target):
+                    # Un saut toujours pris devient un JUMP, un saut jamais pris disparaît
+                    taken = func(left, right) == (op == Op.JUMP_IF_TRUE)
+                    self.instructions[i] = (Op.JUMP, target) if taken else None
+        self.compact()
+
+    def remove_dead_stores(self):
+        """
+        Supprime les affectations écrasées plus loin dans le même bloc de base
+        sans avoir été lues entre-temps. La dernière affectation d'une variable
+        est toujours conservée, pour que la vue variables reste juste, de même
+        qu'une opération qui pourrait lever une exception (x = y + 1 avec y non
+        affectée) : l'optimisation ne change pas le comportement du programme.
+        """
+        jumps = (Op.JUMP, Op.JUMP_IF_FALSE, Op.JUMP_IF_TRUE)
+        targets = {instruction[-1] for instruction in self.instructions if instruction[0] in jumps}
+        # Un parcours en avant d'abord : ints contient les variables qui valent sûrement un entier
+        # à ce point du bloc de base, les seules qu'une opération lit sans risque d'exception
+        removable = [False] * len(self.instructions)
+        ints = set()
+        for i, instruction in enumerate(self.instructions):
+            if i in targets:
+                ints.clear()
+            match instruction:
+                case (Op.SET, var, (is_var, value)):
+                    removable[i] = True  # une simple copie ne lève jamais
+                    if value in ints if is_var else isinstance(value, int):
+                        ints.add(var)
+                    else:
+                        ints.discard(var)
+                case (Op.STORE, var, func, left, right):
+                    removable[i] = all(value in ints for is_var, value in (left, right) if is_var)
+                    # divide peut renvoyer un message plutôt qu'un entier
+                    if removable[i] and func is not divide:
+                        ints.add(var)
+                    else:
+                        ints.discard(var)
+                case (Op.JUMP | Op.JUMP_IF_FALSE | Op.JUMP_IF_TRUE, *_):
+                    ints.clear()
+
+        # Un seul parcours à rebours : overwritten contient les variables affectées plus loin
+        # dans le bloc de base et pas encore lues d'ici là
+        overwritten = set()
+        for i in range(len(self.instructions) - 1, -1, -1):
+            instruction = self.instructions[i]
+            if instruction[0] in jumps:
+                overwritten.clear()
+            elif instruction[0] in (Op.STORE, Op.SET):
+                if instruction[1] in overwritten and removable[i]:
+                    self.instructions[i] = None
+                else:
+                    overwritten.add(instruction[1])
+                    overwritten.difference_update(reads(instruction))
+            else:
+                overwritten.difference_update(reads(instruction))
+            if i in targets:
+                overwritten.clear()
+        self.compact()
+
+    def compact(self):
+        """Retire les instructions supprimées (None) et recalcule les cibles des sauts."""
+        positions = []
+        kept = 0
+        for instruction in self.instructions:
+            positions.append(kept)
+            kept += instruction is not None
+        positions.append(kept)
+        self.linenos = [lineno for instruction, lineno in zip(self.instructions, self.linenos)
+                        if instruction is not None]
+        self.instructions = [
+            instruction[:-1] + (positions[instruction[-1]],)
+            if instruction[0] in (Op.JUMP, Op.JUMP_IF_FALSE, Op.JUMP_IF_TRUE) else instruction
+            for instruction in self.instructions if instruction is not None
+        ]
+
+    def assemble(self) -> Code:
+        """Remplace les noms de variables et les constantes par des indices de slots."""
+        slots = {}
+        constants = {}
+        frame = []
+
+        def slot(operand):
+            is_var, value = operand
+            table, key = (slots, value) if is_var else (constants, (type(value), value))
+            if key not in table:
+                table[key] = len(frame)
+                frame.append(value)
+            return table[key]
+
+        instructions = []
+        for instruction in self.instructions:
+            match instruction:
+                case (Op.STORE, var, func, left, right):
+                    instruction = Op.STORE, slot((True, var)), func, slot(left), slot(right)
+                case (Op.SET, var, value):
+                    instruction = Op.SET, slot((True, var)), slot(value)
+                case (Op.PRINT, value):
+                    instruction = Op.PRINT, slot(value)
+                case (Op.CALL, func, args):
+                    instruction = Op.CALL, func, tuple(map(slot, args))
+                case (Op.JUMP_IF_FALSE | Op.JUMP_IF_TRUE as op, func, left, right, target):
+                    instruction = op, func, slot(left), slot(right), target
+            instructions.append(instruction)
+        return Code(instructions, slots, frame, self.linenos, self.source, self.first_lineno)
+
+
+def reads(instruction) -> set[str]:
+    """Noms des variables lues par une instruction non assemblée."""
+    match instruction:
+        case (Op.STORE, _, _, left, right) | (Op.JUMP_IF_FALSE | Op.JUMP_IF_TRUE, _, left, right, _):
+            operands = (left, right)
+        case (Op.SET, _, value) | (Op.PRINT, value):
+            operands = (value,)
+        case (Op.CALL, _, args):
+            operands = args
+        case _:
+            operands = ()
+    return {value for is_var, value in operands if is_var}
+
+
+def compile_program(program: str, first_lineno: int = 1) -> Code:
+    """
+    Compile un programme en bytecode. Le résultat est mis en cache : recompiler
+    le même source ne repasse pas par le tokenizer.
+    """
+    return _compile_program(program, first_lineno)
+
+
+# Arguments toujours positionnels : compile_program(p) et compile_program(p, 1) partagent le cache
+@functools.lru_cache(maxsize=256)
+def _compile_program(program: str, first_lineno: int) -> Code:
+    return Compiler(program, first_lineno).compile()
+
+
+class OutputSink:
+    """
+    Superclasse des sorties de print : les valeurs sont accumulées dans un
+    tampon, écrit par gros blocs dès qu'il dépasse buffer_size, ou sur flush().
+    """
+    def __init__(self, buffer_size: int = 64 * 1024):
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.size = 0
+
+    def write(self, value):
+        text = f"{value}\n"
+        self.buffer.append(text)
+        self.size += len(text)
+        if self.size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            chunk = ''.join(self.buffer)
+            self.buffer = []
+            self.size = 0
+            self.write_chunk(chunk)
+
+    def write_chunk(self, chunk: str):
+        raise NotImplementedError("La méthode write_chunk doit être implémentée par les sous-classes.")
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ListSink(OutputSink):
+    """Garde la sortie en mémoire, pratique pour les tests."""
+    def __init__(self, buffer_size: int = 64 * 1024):
+        super().__init__(buffer_size)
+        self.chunks = []
+
+    def write_chunk(self, chunk: str):
+        self.chunks.append(chunk)
+
+    def getvalue(self) -> str:
+        return ''.join(self.chunks) + ''.join(self.buffer)
+
+    def lines(self) -> list[str]:
+        return self.getvalue().splitlines()
+
+
+class FileSink(OutputSink):
+    """Écrit dans un fichier ouvert en mode texte, sys.stdout par défaut."""
+    def __init__(self, file=None, buffer_size: int = 64 * 1024):
+        super().__init__(buffer_size)
+        self.file = file
+
+    def write_chunk(self, chunk: str):
+        # sys.stdout est résolu à l'écriture, comme le fait print
+        file = self.file if self.file is not None else sys.stdout
+        file.write(chunk)
+        file.flush()
+
+
+class ThreadSink(OutputSink):
+    """
+    Confie l'écriture des blocs à un thread dédié : flush() ne fait que
+    déposer le bloc dans une file et rend la main immédiatement.
+    """
+    def __init__(self, target: OutputSink, buffer_size: int = 64 * 1024):
+        super().__init__(buffer_size)
+        self.target = target
+        self.chunks = queue.Queue()
+        self.thread = threading.Thread(target=self.worker, daemon=True)
+        self.thread.start()
+
+    def worker(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:  # Condition pour sortir
+                break
+            self.target.write_chunk(chunk)
+
+    def write_chunk(self, chunk: str):
+        self.chunks.put(chunk)
+
+    def close(self):
+        self.flush()
+        self.chunks.put(None)
+        self.thread.join()
+        self.target.close()
+
+
+class Profiler:
+    """Compte les exécutions et le temps passé, par ligne source et par type d'opérateur."""
+    def __init__(self):
+        # clé -> [nombre d'exécutions, temps cumulé en nanosecondes]
+        self.lines = defaultdict(lambda: [0, 0])
+        self.kinds = defaultdict(lambda: [0, 0])
+
+    def record(self, code: Code, pc: int, elapsed: int):
+        lineno = code.linenos[pc]
+        line = self.lines[lineno, code.source_line(lineno).strip()]
+        line[0] += 1
+        line[1] += elapsed
+        kind = self.kinds[OPCODE_KINDS[code.instructions[pc][0]]]
+        kind[0] += 1
+        kind[1] += elapsed
+
+    def hottest(self, k: int = 5) -> list[tuple[int, str, int, float]]:
+        """Les k lignes les plus coûteuses : (numéro, source, exécutions, secondes)."""
+        lines = sorted(self.lines.items(), key=lambda item: item[1][1], reverse=True)[:k]
+        return [(lineno, source, count, elapsed / 1e9) for (lineno, source), (count, elapsed) in lines]
+
+    def report(self, k: int = 5) -> str:
+        rows = [f"{'line':>6} {'count':>10} {'time (ms)':>10}  source"]
+        for lineno, source, count, elapsed in self.hottest(k):
+            rows.append(f"{lineno:>6} {count:>10} {elapsed * 1000:>10.3f}  {source}")
+        for kind, (count, elapsed) in sorted(self.kinds.items(), key=lambda item: item[1][1], reverse=True):
+            rows.append(f"{kind:>18}: {count} executions, {elapsed / 1e6:.3f} ms")
+        return '\n'.join(rows) + '\n'
+
+
+class StatementBuffer:
+    """
+    Regroupe un flux de lignes en instructions de premier niveau. Une ligne
+    simple est rendue dès son arrivée ; un en-tête de bloc (if, while, for)
+    est gardé jusqu'à la première ligne qui n'en fait plus partie, else compris.
+    Seul le bloc en cours est conservé en mémoire. Chaque instruction est
+    rendue avec le numéro de sa première ligne dans le flux.
+    """
+    def __init__(self):
+        self.lines = []
+        self.indent = 0
+        # Nombre de lignes lues, et numéro de la première ligne du bloc en cours
+        self.lineno = 0
+        self.first_lineno = 0
+
+    def feed(self, line):
+        """Ajoute une ligne et renvoie les (instruction, numéro de ligne) devenues complètes."""
+        if isinstance(line, bytes):
+            line = line.decode()
+        line = line.rstrip('\r\n')
+        self.lineno += 1
+        tokens = line.split()
+        if not tokens:
+            # Gardée dans un bloc, pour que ses lignes suivantes restent bien numérotées
+            if self.lines:
+                self.lines.append(line)
+            return
+        indent = len(line) - len(line.lstrip())
+        if self.lines and indent <= self.indent and not (tokens == ['else', ':'] and indent == self.indent):
+            yield self.flush()
+        if self.lines:
+            self.lines.append(line)
+        elif tokens[-1] == ':':
+            self.lines, self.indent, self.first_lineno = [line], indent, self.lineno
+        else:
+            yield line, self.lineno
+
+    def flush(self) -> tuple[str, int]:
+        """Renvoie le bloc en cours, même incomplet, et vide le tampon."""
+        chunk = '\n'.join(self.lines)
+        self.lines = []
+        return chunk, self.first_lineno
+
+
 class Interpreter:
     """Interprète un mini-langage de programmation."""
-    def __init__(self):
+    def __init__(self, output: OutputSink = None, profile: bool = False):
         self.variables = {}
+        self.output = output if output is not None else FileSink()
+        self.profiler = Profiler() if profile else None
 
     def get_value(self, token):
         """Renvoie la valeur d'un token, soit un entier, soit une variable stockée."""
-        try:
+        if is_integer(token):
             return int(token)
-        except ValueError:
-            return self.variables.get(token, token)
+        return self.variables.get(token, token)
 
     def execute_line(self, line):
-        # Analyse et exécute une seule ligne de code
+        # Analyse et exécute une seule ligne de code ; ce qu'elle affiche est écrit aussitôt
         tokens = line.split()
         match tokens:
             # Affectation d'une variable avec une opération mathématique
@@ -90,14 +587,16 @@ class Interpreter:
             # Fonction print avec une seule variable ou valeur
             case ['print', var]:
                 func = Func('print', self.get_value(var))
-                func.execute()
+                func.execute(self.output)
+                self.output.flush()
 
             # Fonction max/min avec plusieurs arguments
             case [func_name, *args] if func_name in ['max', 'min']:
                 func_args = [self.get_value(arg) for arg in args]
                 func = Func(func_name, *func_args)
                 result = func.execute()
-                print(result)
+                self.output.write(result)
+                self.output.flush()
 
             # Condition if avec un opérateur de comparaison
             case ['if', left, op, right, ':'] if op in ['>', '<', '==', '!=', '>=', '<=']:
@@ -111,22 +610,303 @@ class Interpreter:
             case ['else', ':']:
                 return 'else'
 
+    def compile(self, program: str, first_lineno: int = 1) -> Code:
+        return compile_program(program, first_lineno)
+
     def run(self, program):
-        # Traite un programme complet ligne par ligne
-        lines = program.splitlines()
-        i = 0
-        while i < len(lines):
-            result = self.execute_line(lines[i])
-            if result == 'if_true':
-                i += 1  # Exécute la ligne suivante si la condition est vraie
-                self.execute_line(lines[i].strip())
-                i += 1  # Ignorer le bloc else
-            elif result == 'if_false':
-                i += 2  # Sauter le bloc else si la condition est fausse
+        # Compile le programme (ou le récupère du cache) puis exécute le bytecode
+        code = program if isinstance(program, Code) else self.compile(program)
+        try:
+            self.run_code(code)
+        finally:
+            self.end_run()
+
+    def run_code(self, code: Code):
+        frame = self.load_frame(code)
+        try:
+            if self.profiler is None:
+                self.execute(code.instructions, frame)
             else:
-                i += 1
+                self.execute_profiled(code, frame)
+        finally:
+            self.store_frame(code, frame)
+
+    def end_run(self):
+        """Vide la sortie et, en mode profilage, affiche les lignes les plus coûteuses sur stderr."""
+        self.output.flush()
+        if self.profiler is not None:
+            sys.stderr.write(self.profiler.report())
+
+    def run_stream(self, lines):
+        """
+        Exécute un programme au fil de l'eau depuis n'importe quel itérable de
+        lignes (générateur, fichier texte ou binaire...), sans le charger en entier.
+        La sortie de chaque instruction est écrite dès qu'elle a été exécutée.
+        """
+        buffer = StatementBuffer()
+        try:
+            for line in lines:
+                for chunk, lineno in buffer.feed(line):
+                    self.run_code(self.compile(chunk, lineno))
+                    self.output.flush()
+            if buffer.lines:
+                self.run_code(self.compile(*buffer.flush()))
+        finally:
+            self.end_run()
+
+    async def run_async_stream(self, stream):
+        """Variante de run_stream pour un asyncio.StreamReader ou tout itérable asynchrone de lignes."""
+        buffer = StatementBuffer()
+        try:
+            async for line in stream:
+                for chunk, lineno in buffer.feed(line):
+                    self.run_code(self.compile(chunk, lineno))
+                    self.output.flush()
+            if buffer.lines:
+                self.run_code(self.compile(*buffer.flush()))
+        finally:
+            self.end_run()
+
+    def load_frame(self, code: Code) -> list:
+        """Prépare le tableau de slots, en reprenant les variables déjà connues."""
+        frame = list(code.frame)
+        for name, slot in code.slots.items():
+            if name in self.variables:
+                frame[slot] = self.variables[name]
+        return frame
+
+    def store_frame(self, code: Code, frame: list):
+        """Recopie les slots affectés dans le dictionnaire variables, utile pour le débogage."""
+        for name, slot in code.slots.items():
+            if frame[slot] != name:
+                self.variables[name] = frame[slot]
+
+    def run_batch(self, program, columns: dict) -> dict:
+        """
+        Exécute le programme une seule fois sur tout un lot de lignes : chaque
+        colonne de columns est un tableau numpy, lié à la variable du même nom.
+        Les branchements sont traités avec des masques ; renvoie les variables
+        affectées, sous forme de tableaux.
+        """
+        if np is None:
+            raise RuntimeError("run_batch nécessite numpy")
+        code = program if isinstance(program, Code) else self.compile(program)
+        columns = {name: np.asarray(column) for name, column in columns.items()}
+        sizes = {len(column) for column in columns.values()}
+        if len(sizes) > 1:
+            raise ValueError("Toutes les colonnes doivent avoir la même longueur", sizes)
+        size = sizes.pop() if sizes else 1
+
+        frame = self.load_frame(code)
+        for name, column in columns.items():
+            if name in code.slots:
+                frame[code.slots[name]] = column
+        try:
+            self.execute_batch(code.instructions, frame, np.ones(size, dtype=bool))
+        finally:
+            self.output.flush()
+        return {name: frame[slot] for name, slot in code.slots.items()
+                if frame[slot] is not code.frame[slot] or name in columns}
+
+    def execute_batch(self, instructions, frame: list, mask):
+        """
+        Chaque groupe de lignes actives (masque) attend à une position du bytecode.
+        On avance toujours le groupe le moins avancé, ce qui fait reconverger
+        les branches d'un if/else et les lignes sorties d'une boucle.
+        """
+        functions = batch_functions()
+        write = self.output.write
+        pending = {0: mask}
+        while pending:
+            pc = min(pending)
+            mask = pending.pop(pc)
+            while pc < len(instructions) and pc not in pending:
+                instruction = instructions[pc]
+                pc += 1
+                match instruction[0]:
+                    case Op.STORE | Op.SET:
+                        if instruction[0] == Op.STORE:
+                            _, var, func, left, right = instruction
+                            value = functions.get(func, func)(frame[left], frame[right])
+                        else:
+                            _, var, value = instruction
+                            value = frame[value]
+                        if mask.all():
+                            frame[var] = value
+                        elif isinstance(frame[var], str):
+                            # Les lignes non affectées gardent le nom de la variable, comme en scalaire
+                            frame[var] = np.where(mask, np.asarray(value, dtype=object), frame[var])
+                        else:
+                            frame[var] = np.where(mask, value, frame[var])
+                    case Op.PRINT:
+                        value = frame[instruction[1]]
+                        write(value[mask] if np.ndim(value) else value)
+                    case Op.CALL:
+                        _, func, args = instruction
+                        value = functions[func]([frame[arg] for arg in args])
+                        write(value[mask] if np.ndim(value) else value)
+                    case Op.JUMP_IF_FALSE | Op.JUMP_IF_TRUE:
+                        _, func, left, right, target = instruction
+                        condition = func(frame[left], frame[right])
+                        if instruction[0] == Op.JUMP_IF_FALSE:
+                            condition = np.logical_not(condition)
+                        taken = mask & condition
+                        if taken.any():
+                            # Les deux groupes repassent par pending : le moins avancé repart en premier
+                            pending[target] = pending[target] | taken if target in pending else taken
+                            mask = mask & ~taken
+                            if mask.any():
+                                pending[pc] = pending[pc] | mask if pc in pending else mask
+                            break
+                    case Op.JUMP:
+                        target = instruction[1]
+                        pending[target] = pending[target] | mask if target in pending else mask
+                        break
+            else:
+                # Un autre groupe attend à cette position : on fusionne les masques
+                if pc < len(instructions):
+                    pending[pc] = pending[pc] | mask
+
+    def execute(self, instructions, frame: list):
+        write = self.output.write
+        pc = 0
+        while pc < len(instructions):
+            instruction = instructions[pc]
+            pc += 1
+            match instruction[0]:
+                case Op.STORE:
+                    _, var, func, left, right = instruction
+                    frame[var] = func(frame[left], frame[right])
+                case Op.PRINT:
+                    write(frame[instruction[1]])
+                case Op.CALL:
+                    _, func, args = instruction
+                    write(func([frame[arg] for arg in args]))
+                case Op.JUMP_IF_FALSE:
+                    _, func, left, right, target = instruction
+                    if not func(frame[left], frame[right]):
+                        pc = target
+                case Op.JUMP:
+                    pc = instruction[1]
+                case Op.SET:
+                    frame[instruction[1]] = frame[instruction[2]]
+                case Op.JUMP_IF_TRUE:
+                    _, func, left, right, target = instruction
+                    if func(frame[left], frame[right]):
+                        pc = target
+
+    def execute_profiled(self, code: Code, frame: list):
+        # Boucle séparée de execute, pour que le mode normal ne paie rien
+        instructions = code.instructions
+        record = self.profiler.record
+        clock = time.perf_counter_ns
+        pc = 0
+        while pc < len(instructions):
+            start = clock()
+            next_pc = self.step(instructions[pc], frame, pc + 1)
+            record(code, pc, clock() - start)
+            pc = next_pc
+
+    def step(self, instruction, frame: list, pc: int) -> int:
+        """Exécute une seule instruction et renvoie la position de la suivante."""
+        match instruction[0]:
+            case Op.STORE:
+                _, var, func, left, right = instruction
+                frame[var] = func(frame[left], frame[right])
+            case Op.PRINT:
+                self.output.write(frame[instruction[1]])
+            case Op.CALL:
+                _, func, args = instruction
+                self.output.write(func([frame[arg] for arg in args]))
+            case Op.JUMP_IF_FALSE:
+                _, func, left, right, target = instruction
+                if not func(frame[left], frame[right]):
+                    return target
+            case Op.JUMP:
+                return instruction[1]
+            case Op.SET:
+                frame[instruction[1]] = frame[instruction[2]]
+            case Op.JUMP_IF_TRUE:
+                _, func, left, right, target = instruction
+                if func(frame[left], frame[right]):
+                    return target
+        return pc
+
+
+class TimeLimitExceeded(Exception):
+    """Levée quand un programme dépasse son temps CPU."""
+    pass
+
+
+@contextlib.contextmanager
+def cpu_time_limit(seconds: float = None):
+    """
+    Interrompt le bloc après seconds de temps CPU, via le timer ITIMER_PROF :
+    rien n'est vérifié dans la boucle d'exécution. Sans effet si seconds est
+    None ou si la plateforme n'a pas setitimer (Windows).
+    """
+    if not seconds or not hasattr(signal, 'setitimer'):
+        yield
+        return
+
+    def on_timeout(signum, frame):
+        raise TimeLimitExceeded(f"Temps CPU dépassé ({seconds}s)")
+
+    previous = signal.signal(signal.SIGPROF, on_timeout)
+    signal.setitimer(signal.ITIMER_PROF, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, previous)
+
+
+class ProgramResult:
+    """Résultat d'un programme exécuté par ParallelRunner."""
+    def __init__(self, index: int, variables: dict, output: str, error: str = None, cpu_time: float = 0.0):
+        self.index = index
+        self.variables = variables
+        self.output = output
+        self.error = error
+        self.cpu_time = cpu_time
+
+    def __repr__(self):
+        status = self.error if self.error is not None else "ok"
+        return f"ProgramResult({self.index}, {status}, {self.cpu_time:.3f}s)"
+
+
+def run_program(job: tuple[int, str, float]) -> ProgramResult:
+    """Exécute un programme dans un interpréteur neuf, avec sa propre sortie capturée."""
+    index, program, time_limit = job
+    output = ListSink()
+    interpreter = Interpreter(output=output)
+    error = None
+    start = time.process_time()
+    try:
+        with cpu_time_limit(time_limit):
+            interpreter.run(program)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return ProgramResult(index, interpreter.variables, output.getvalue(), error, time.process_time() - start)
+
+
+class ParallelRunner:
+    """
+    Répartit de nombreux programmes indépendants sur un pool de processus.
+    Les résultats arrivent dans l'ordre où les programmes se terminent ;
+    ProgramResult.index indique la position du programme dans l'entrée.
+    """
+    def __init__(self, processes: int = None, time_limit: float = None):
+        self.processes = processes
+        self.time_limit = time_limit
+
+    def run(self, programs):
+        jobs = ((index, program, self.time_limit) for index, program in enumerate(programs))
+        with multiprocessing.Pool(self.processes) as pool:
+            yield from pool.imap_unordered(run_program, jobs)
+
 
-program = """
+PROGRAM = """
 x = 5 + 3
 y = x * 2
 if x > 5 :
@@ -135,5 +915,6 @@ else :
     print 0
 """
 
-interpreter = Interpreter()
-interpreter.run(program)
+if __name__ == "__main__":
+    interpreter = Interpreter()
+    interpreter.run(PROGRAM)
@@ -18,24 +18,59 @@ class Cat(Animal):
 
 
 class Factory:
+    def __init__(self):
+        # (keys, type) -> constructor, decided once per schema by the match in resolve
+        self.constructors = {}
+
     def create_dog(self, name: str):
         return Dog(name)
 
     def create_cat(self, name: str):
         return Cat(name)
 
-    def create(self, item: dict):
+    def resolve(self, item: dict):
         match item:
-            case {"type": "cat", "name": name}:
-                return self.create_cat(name)
-            case {"type": "dog", "name": name}:
-                return self.create_dog(name)
+            case {"type": "cat", "name": _}:
+                return self.create_cat
+            case {"type": "dog", "name": _}:
+                return self.create_dog
             case _:
-                raise RuntimeError("Invalid item", item)
+                return None
+
+    def constructor(self, item: dict):
+        schema = (tuple(item), item.get("type"))
+        if schema not in self.constructors:
+            self.constructors[schema] = self.resolve(item)
+        return self.constructors[schema]
+
+    def create(self, item: dict):
+        constructor = self.constructor(item)
+        if constructor is None:
+            raise RuntimeError("Invalid item", item)
+        return constructor(item["name"])
 
     def create_from_dict(self, from_json: list[dict]):
         return [self.create(item) for item in from_json]
 
+    def create_many(self, from_json: list[dict]):
+        """
+        Builds the animals class by class, from the column of their names. Returns them in
+        input order, with the (index, item) that match no schema instead of raising.
+        """
+        names = {}
+        unmatched = []
+        for index, item in enumerate(from_json):
+            constructor = self.constructor(item)
+            if constructor is None:
+                unmatched.append((index, item))
+            else:
+                names.setdefault(constructor, {})[index] = item["name"]
+
+        animals = {}
+        for constructor, column in names.items():
+            animals.update(zip(column, map(constructor, column.values())))
+        return [animals[index] for index in sorted(animals)], unmatched
+
 
 if __name__ == '__main__':
     factory = Factory()
@@ -44,3 +79,4 @@ if __name__ == '__main__':
     }, {
         "type": "dog", "name": "Rocky"
     }]))
+    print(factory.create_many([{"type": "cat", "name": "Tom"}, {"type": "bird", "name": "Tweety"}]))
@@ -0,0 +1,23 @@
+from factory import Cat, Dog, Factory
+
+
+def test_create_many():
+    factory = Factory()
+    items = [{"type": "cat", "name": "Tom"}, {"type": "bird", "name": "Tweety"},
+             {"type": "dog", "name": "Rocky"}, {"type": "cat", "name": "Felix"}]
+    animals, unmatched = factory.create_many(items)
+    assert [(type(animal), animal.name) for animal in animals] == [(Cat, "Tom"), (Dog, "Rocky"), (Cat, "Felix")]
+    assert unmatched == [(1, items[1])]
+
+
+def test_constructor_cache():
+    factory = Factory()
+    calls = []
+    factory.create_cat = lambda name: calls.append(name) or Cat(name)
+    factory.create_many([{"type": "cat", "name": "Tom"}, {"type": "cat", "name": "Felix"}])
+    assert calls == ["Tom", "Felix"]
+    assert list(factory.constructors) == [(("type", "name"), "cat")]
+
+    factory.resolve = None  # a known schema no longer goes through the match
+    assert factory.create({"type": "cat", "name": "Garfield"}).name == "Garfield"
+    assert calls == ["Tom", "Felix", "Garfield"]
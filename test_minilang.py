@@ -0,0 +1,273 @@
+import asyncio
+import time
+from unittest import mock
+
+import pytest
+
+from minilang import *
+
+
+def test_compile_is_cached():
+    program = "x = 5 + 3\nprint x"
+    code = compile_program(program)
+    assert code is Interpreter().compile(program)
+    with mock.patch('minilang.compile_line') as compile_line:
+        Interpreter().run(program)
+        assert compile_line.call_count == 0
+
+
+def test_run_compiled(capsys):
+    interpreter = Interpreter()
+    interpreter.run(PROGRAM)
+    assert interpreter.variables == {'x': 8, 'y': 16}
+    assert capsys.readouterr().out == "16\n"
+
+
+def test_else_branch(capsys):
+    Interpreter().run("x = 1 + 1\nif x > 5 :\n    print x\nelse :\n    print 0\nmin 4 x 3")
+    assert capsys.readouterr().out == "0\n2\n"
+
+
+def test_division_by_zero():
+    interpreter = Interpreter()
+    interpreter.run("x = 4 / 0")
+    assert interpreter.variables['x'] == 'Division par zéro'
+
+
+def test_nested_blocks(capsys):
+    Interpreter().run("""
+x = 3
+if x > 1 :
+    if x > 5 :
+        print 1
+    else :
+        print 2
+        print 3
+else :
+    print 4
+print 5
+""")
+    assert capsys.readouterr().out == "2\n3\n5\n"
+
+
+def test_while_loop():
+    interpreter = Interpreter()
+    interpreter.run("i = 0\nwhile i < 10 :\n    i = i + 3")
+    assert interpreter.variables['i'] == 12
+
+
+def test_for_loop():
+    interpreter = Interpreter()
+    interpreter.run("total = 0\nfor i in range 1 5 :\n    for j in range i :\n        total = total + j")
+    assert interpreter.variables['total'] == 0 + 1 + 3 + 6
+    assert interpreter.variables['i'] == 5
+
+
+def test_jumps_are_precomputed():
+    code = compile_program("i = 0\nwhile i < 3 :\n    i = i + 1\nprint i")
+    assert [instruction[0] for instruction in code.instructions] == [
+        Op.SET, Op.JUMP, Op.STORE, Op.JUMP_IF_TRUE, Op.PRINT
+    ]
+    assert code.instructions[1][-1] == 3
+    assert code.instructions[3][-1] == 2
+
+
+def test_constant_folding():
+    code = compile_program("x = 5 + 3\nif 1 > 2 :\n    print x")
+    assert [instruction[0] for instruction in code.instructions] == [Op.SET, Op.JUMP, Op.PRINT]
+    assert code.frame[code.instructions[0][2]] == 8
+
+
+def test_dead_stores_are_removed():
+    code = compile_program("x = 1\ny = 2\nx = y + 1\nprint x\nx = 4")
+    assert len(code) == 4
+    interpreter = Interpreter()
+    interpreter.run(code)
+    assert interpreter.variables == {'x': 4, 'y': 2}
+
+
+def test_dead_store_removal_is_linear():
+    # Chaque variable est affectée deux fois : la première affectation est morte
+    lines = ["a = 7"] + [f"v{i} = {i} + a" for i in range(20_000)] + [f"v{i} = a + {i}" for i in range(20_000)]
+    t0 = time.perf_counter()
+    code = Compiler("\n".join(lines)).compile()
+    assert time.perf_counter() - t0 < 10
+    assert len(code) == 20_001
+
+
+def test_dead_stores_keep_their_errors():
+    # y n'est pas affectée : y + 1 lève, même si x est écrasée juste après
+    with pytest.raises(TypeError):
+        Interpreter().run("x = y + 1\nx = 2")
+    interpreter = Interpreter()
+    interpreter.run("y = 4\nx = y + 1\nx = 2")
+    assert interpreter.variables == {'x': 2, 'y': 4}
+    assert len(compile_program("y = 4\nx = y + 1\nx = 2")) == 2
+    # Après une division, la variable peut valoir un message : l'opération qui la lit est gardée
+    assert len(compile_program("y = 4 / z\nx = y - 1\nx = 2")) == 3
+
+
+def test_dead_stores_stop_at_jump_targets():
+    code = compile_program("x = 1\nwhile x < 3 :\n    x = x + 1\nx = 5")
+    interpreter = Interpreter()
+    interpreter.run(code)
+    assert interpreter.variables["x"] == 5
+
+
+def test_variables_are_kept_between_runs(capsys):
+    interpreter = Interpreter()
+    interpreter.run("x = 2")
+    interpreter.run("y = x * 5\nprint y\nprint z")
+    assert interpreter.variables == {'x': 2, 'y': 10}
+    assert capsys.readouterr().out == "10\nz\n"
+
+
+def test_run_batch_matches_scalar():
+    np = pytest.importorskip("numpy")
+    program = """
+z = x / d
+if x > 5 :
+    w = x - 100
+else :
+    w = x * 2
+total = 0
+for i in range x :
+    total = total + i
+"""
+    xs, ds = [1, 6, 10, 3, -7], [2, 0, 3, -2, 2]
+    result = Interpreter().run_batch(program, {'x': np.array(xs), 'd': np.array(ds)})
+    for row, (x, d) in enumerate(zip(xs, ds)):
+        interpreter = Interpreter()
+        interpreter.variables.update(x=x, d=d)
+        interpreter.run(program)
+        for name in ('z', 'w', 'total'):
+            assert result[name][row] == interpreter.variables[name]
+
+
+def test_run_batch_max_min(capsys):
+    np = pytest.importorskip("numpy")
+    Interpreter().run_batch("max x y 4\nmin x y", {'x': np.array([1, 9]), 'y': np.array([5, 2])})
+    assert capsys.readouterr().out == "[5 9]\n[1 2]\n"
+
+
+def test_run_stream_executes_as_lines_arrive():
+    interpreter = Interpreter()
+
+    def lines():
+        yield "x = 2\n"
+        assert interpreter.variables == {'x': 2}
+        yield "if x > 1 :\n"
+        yield "    y = x * 10\n"
+        yield "else :\n"
+        yield "    y = 0\n"
+        assert 'y' not in interpreter.variables  # le bloc attend la fin du else
+        yield "z = y + 1\n"
+        assert interpreter.variables['y'] == 20
+        yield "for i in range 3 :\n"
+        yield "    z = z + i"
+
+    interpreter.run_stream(lines())
+    assert interpreter.variables['z'] == 24
+
+
+def test_output_is_not_held_back(capsys):
+    Interpreter().execute_line("print 5")
+    assert capsys.readouterr().out == "5\n"
+
+    def lines():
+        yield "print 1\n"
+        assert capsys.readouterr().out == "1\n"  # affiché avant la fin du flux
+        yield "print 2\n"
+
+    Interpreter().run_stream(lines())
+    assert capsys.readouterr().out == "2\n"
+
+
+def test_run_stream_from_file(tmp_path, capsys):
+    path = tmp_path / "program.txt"
+    path.write_text(PROGRAM)
+    with open(path, "rb") as fp:
+        Interpreter().run_stream(fp)
+    assert capsys.readouterr().out == "16\n"
+
+
+def test_run_async_stream(capsys):
+    async def main():
+        reader = asyncio.StreamReader()
+        reader.feed_data(PROGRAM.encode())
+        reader.feed_eof()
+        await Interpreter().run_async_stream(reader)
+
+    asyncio.run(main())
+    assert capsys.readouterr().out == "16\n"
+
+
+def test_list_sink_captures_output():
+    sink = ListSink()
+    interpreter = Interpreter(output=sink)
+    interpreter.run("for i in range 3 :\n    print i\nmax 4 7")
+    assert sink.lines() == ["0", "1", "2", "7"]
+    interpreter.execute_line("print 5")
+    assert sink.chunks == ["0\n1\n2\n7\n", "5\n"]  # une ligne isolée est écrite aussitôt
+
+
+def test_file_sink_writes_in_chunks(tmp_path):
+    path = tmp_path / "out.txt"
+    with open(path, "w") as fp:
+        sink = FileSink(fp, buffer_size=8)
+        sink.write(1)
+        assert sink.buffer == ["1\n"]
+        sink.write(12345678)
+        assert sink.buffer == []
+        sink.write(3)
+        sink.close()
+    assert path.read_text() == "1\n12345678\n3\n"
+
+
+def test_thread_sink():
+    target = ListSink()
+    with ThreadSink(target, buffer_size=4) as sink:
+        Interpreter(output=sink).run("for i in range 100 :\n    print i")
+    assert target.lines() == [str(i) for i in range(100)]
+
+
+def test_profiling(capsys):
+    interpreter = Interpreter(output=ListSink(), profile=True)
+    interpreter.run("x = 0\nfor i in range 10 :\n    x = x + i\nprint x")
+    profiler = interpreter.profiler
+    assert profiler.lines[3, 'x = x + i'][0] == 10
+    assert profiler.kinds['MathOperator'][0] == 20
+    assert profiler.kinds['ComparisonOperator'][0] == 11
+    assert profiler.kinds['Func'][0] == 1
+    assert profiler.hottest(1)[0][0] in (2, 3)
+    assert "x = x + i" in capsys.readouterr().err
+    assert interpreter.output.lines() == ["45"]
+
+
+def test_profiling_stream(capsys):
+    interpreter = Interpreter(output=ListSink(), profile=True)
+    interpreter.run_stream(["x = 1\n", "\n", "y = 2\n", "for i in range 3 :\n", "\n", "    y = y + i\n", "z = 3\n"])
+    assert set(interpreter.profiler.lines) == {(1, 'x = 1'), (3, 'y = 2'), (4, 'for i in range 3 :'),
+                                                 (6, 'y = y + i'), (7, 'z = 3')}
+    assert interpreter.profiler.lines[6, 'y = y + i'][0] == 3
+    assert interpreter.variables['y'] == 5
+
+
+def test_profiling_is_off_by_default():
+    interpreter = Interpreter()
+    assert interpreter.profiler is None
+    with mock.patch.object(Interpreter, 'execute_profiled') as execute_profiled:
+        interpreter.run("x = 1")
+        assert execute_profiled.call_count == 0
+
+
+def test_parallel_runner():
+    programs = ["x = 1\nprint x", "y = 6 * 7\nprint y", "z = 0\nwhile 1 < 2 :\n    z = z + 1", "x = 2\nprint x"]
+    results = list(ParallelRunner(processes=2, time_limit=0.5).run(programs))
+    assert sorted(result.index for result in results) == [0, 1, 2, 3]
+    results = {result.index: result for result in results}
+    assert results[0].output == "1\n" and results[0].variables == {'x': 1}
+    assert results[1].output == "42\n" and results[1].variables == {'y': 42}
+    assert results[3].variables == {'x': 2}
+    assert results[2].error.startswith("TimeLimitExceeded")
+    assert results[0].error is None
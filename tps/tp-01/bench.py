@@ -0,0 +1,315 @@
+import contextlib
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from commands import execute_batch
+from db import City, Db
+from loader import load_db
+from persistence import PersistentDb
+from sharding import ShardedDb
+from snapshot import Snapshot
+
+
+def make_cities(n: int) -> list[City]:
+    random.seed(0)
+    return [City(f"city-{i}", random.randint(1, 95), "France", random.randint(100, 2_000_000)) for i in range(n)]
+
+
+def bench_insert(n: int = 1_000_000, step: int = 100_000):
+    cities = make_cities(n)
+    db = Db([])
+    for start in range(0, n, step):
+        t0 = time.perf_counter()
+        for city in cities[start:start + step]:
+            db.add(city)
+        elapsed = time.perf_counter() - t0
+        print(f"add {start:>9} -> {start + step:>9}: {elapsed * 1e9 / step:.0f} ns/city")
+
+    db = Db([])
+    t0 = time.perf_counter()
+    db.add_many(cities)
+    print(f"add_many {n}: {time.perf_counter() - t0:.3f}s")
+
+
+def bench_top(n: int = 1_000_000, k: int = 10, repeat: int = 100):
+    cities = make_cities(n)
+    for sorted_index in (False, True):
+        db = Db(cities, sorted_index=sorted_index)
+        t0 = time.perf_counter()
+        db.top(k)
+        elapsed = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            db.top(k, department=83)
+        per_department = (time.perf_counter() - t0) / repeat
+        print(f"top({k}) sorted_index={sorted_index}: {elapsed * 1000:.3f} ms, "
+              f"per department: {per_department * 1000:.3f} ms")
+
+
+def bench_memory(n: int = 1_000_000):
+    # Same parsing as gen_db in geo.py, so every field is a fresh object as when reading input.csv
+    random.seed(0)
+    lines = [f"city-{i},{random.randint(1, 95)},{random.choice(['France', 'Italia'])},{random.randint(100, 2_000_000)}"
+             for i in range(n)]
+
+    def parse(line: str) -> City:
+        name, department_as_str, country, population_as_str = line.split(",")
+        return City(name, int(department_as_str), country, int(population_as_str))
+
+    for columnar in (False, True):
+        tracemalloc.start()
+        db = Db([], columnar=columnar)
+        db.add_many(map(parse, lines))
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"columnar={columnar}: {current / 2 ** 20:.1f} MiB for {n} cities ({current / n:.0f} bytes/city), "
+              f"peak {peak / 2 ** 20:.1f} MiB")
+        del db
+
+
+def bench_load(n: int = 1_000_000):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "input.csv")
+        random.seed(0)
+        with open(path, "w") as fp:
+            for i in range(n):
+                fp.write(f"city-{i},{random.randint(1, 95)},France,{random.randint(100, 2_000_000)}\n")
+        size = os.path.getsize(path) / 2 ** 20
+
+        # Former gen_db: a list of every city, then the Db
+        t0 = time.perf_counter()
+        cities = []
+        with open(path, "r") as fp:
+            for line in fp:
+                name, department_as_str, country, population_as_str = line.split(",")
+                cities.append(City(name, int(department_as_str), country, int(population_as_str)))
+        Db(cities)
+        del cities
+        print(f"line by line: {time.perf_counter() - t0:.2f}s for {size:.0f} MiB")
+
+        for processes in (1, None):
+            t0 = time.perf_counter()
+            load_db(path, processes=processes, chunk_size=4 * 2 ** 20)
+            elapsed = time.perf_counter() - t0
+            print(f"load_db processes={processes}: {elapsed:.2f}s ({size / elapsed:.0f} MiB/s)")
+
+
+def bench_flush(n: int = 200_000, repeat: int = 20):
+    cities = make_cities(n)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "input.csv")
+        db = Db(cities)
+        t0 = time.perf_counter()
+        for i in range(repeat):
+            db.add(City(f"new-{i}", 83, "France", i))
+            db.flush(path)
+        print(f"Db.flush after one add: {(time.perf_counter() - t0) / repeat * 1000:.3f} ms")
+
+        db = PersistentDb(os.path.join(directory, "persistent.csv"))
+        db.add_many(cities)
+        db.flush()
+        t0 = time.perf_counter()
+        for i in range(repeat):
+            db.add(City(f"new-{i}", 83, "France", i))
+            db.flush()
+        print(f"PersistentDb.flush after one add: {(time.perf_counter() - t0) / repeat * 1000:.3f} ms")
+        db.close()
+
+
+def bench_snapshot(n: int = 1_000_000):
+    cities = make_cities(n)
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, "input.csv")
+        snapshot_path = os.path.join(directory, "input.snap")
+        db = Db(cities)
+        db.flush(csv_path)
+        t0 = time.perf_counter()
+        Snapshot.write(db, snapshot_path)
+        print(f"snapshot written in {time.perf_counter() - t0:.2f}s")
+        del db
+
+        t0 = time.perf_counter()
+        db = load_db(csv_path)
+        db["city-42"]
+        print(f"csv cold start: {time.perf_counter() - t0:.3f}s")
+        del db
+
+        t0 = time.perf_counter()
+        with Snapshot(snapshot_path) as snapshot:
+            snapshot["city-42"]
+            print(f"snapshot cold start: {(time.perf_counter() - t0) * 1000:.3f} ms")
+            t0 = time.perf_counter()
+            for i in range(10_000):
+                snapshot[f"city-{i}"]
+            print(f"snapshot lookup: {(time.perf_counter() - t0) / 10_000 * 1e6:.1f} us")
+
+
+def bench_search(n: int = 200_000, repeat: int = 100):
+    random.seed(0)
+    syllables = ["ba", "bel", "chat", "dor", "fon", "gar", "lan", "mar", "mont", "neu", "pon", "ri", "roc",
+                 "sai", "ter", "tou", "val", "ver", "ville", "zan"]
+    names = {"".join(random.choices(syllables, k=4)).capitalize() for _ in range(n)}
+    cities = [City(name, random.randint(1, 95), "France", random.randint(100, 2_000_000)) for name in names]
+    queries = random.sample(sorted(names), repeat)
+
+    for indexed in (False, True):
+        db = Db(cities, sorted_index=indexed, search_index=indexed)
+        timings = []
+        t0 = time.perf_counter()
+        for query in queries:
+            list(db.search_prefix(query[:4], limit=10))
+        timings.append(f"prefix {(time.perf_counter() - t0) / repeat * 1000:.3f} ms")
+        t0 = time.perf_counter()
+        for i in range(repeat):
+            list(db.population_between(50_000 + i, 200_000, limit=100))
+        timings.append(f"range {(time.perf_counter() - t0) / repeat * 1000:.3f} ms")
+        if indexed:
+            t0 = time.perf_counter()
+            for query in queries:
+                typo = query[:3] + query[4:]
+                list(db.search_fuzzy(typo))
+            timings.append(f"fuzzy {(time.perf_counter() - t0) / repeat * 1000:.3f} ms")
+        print(f"search indexed={indexed} ({len(cities)} cities): " + ", ".join(timings))
+
+
+def bench_cache(n: int = 200_000, repeat: int = 2_000, write_every: int = 100):
+    random.seed(0)
+    cities = make_cities(n)
+    # Skewed read traffic: a few departments and k values are asked most of the time
+    queries = [(random.choice((13, 33, 59, 69, 75)), random.choice((5, 10))) for _ in range(repeat)]
+
+    for cache_size in (0, 256):
+        db = Db(cities, columnar=True, cache_size=cache_size)
+        t0 = time.perf_counter()
+        for i, (department, k) in enumerate(queries):
+            db.list_in_department(department)
+            db.top(k, department=department)
+            if i % write_every == 0:
+                db.add(City(f"New-{i}", random.randint(1, 95), "France", random.randint(100, 2_000_000)))
+        elapsed = time.perf_counter() - t0
+        stats = "" if db.query_cache is None else f", {db.query_cache.hits} hits / {db.query_cache.misses} misses"
+        print(f"cache_size={cache_size}: {2 * repeat / elapsed:.0f} queries/s{stats}")
+
+
+def bench_sharding(n: int = 1_000_000, k: int = 10, repeat: int = 100):
+    cities = make_cities(n)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "db.csv")
+
+        t0 = time.perf_counter()
+        db = Db(cities)
+        load = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            db.top(k)
+        top = (time.perf_counter() - t0) / repeat
+        t0 = time.perf_counter()
+        db.flush(path)
+        flush = time.perf_counter() - t0
+        print(f"single process: load {load:.2f}s, top({k}) {top * 1000:.2f} ms, flush {flush:.2f}s")
+        del db
+
+        shards = os.cpu_count()
+        t0 = time.perf_counter()
+        with ShardedDb(cities, shards=shards) as sharded:
+            load = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                sharded.top(k)
+            top = (time.perf_counter() - t0) / repeat
+            t0 = time.perf_counter()
+            sharded.flush(path)
+            flush = time.perf_counter() - t0
+        print(f"{shards} shards: load {load:.2f}s, top({k}) {top * 1000:.2f} ms, flush {flush:.2f}s")
+
+
+def process_prompt_loop(db: Db, prompts: list[str]):
+    # The per-command loop of geo.process_prompt: startswith chain, one print per command
+    for prompt in prompts:
+        prompt_split = prompt.split(" ")
+        if prompt.startswith("get city"):
+            _, _, city = prompt_split
+            print(db[city])
+        elif prompt.startswith("get department"):
+            _, _, department_as_str = prompt_split
+            print(db.list_in_department(int(department_as_str)))
+        elif prompt.startswith("add "):
+            _, city_or_dep, department_as_str, country, population_as_str = prompt_split
+            city = City(city_or_dep, int(department_as_str), country, int(population_as_str))
+            db.add(city)
+            print("Added", city)
+        elif prompt.startswith("delete"):
+            _, city_or_dep = prompt_split
+            db.delete(city_or_dep)
+            print(city_or_dep, "was deleted")
+        elif prompt.startswith("top "):
+            _, k = prompt_split
+            db.top(int(k))
+
+
+def bench_replay(n: int = 200_000):
+    random.seed(0)
+    prompts = []
+    for i in range(n):
+        kind = random.random()
+        if kind < 0.7:
+            prompts.append(f"add city-{i} {random.randint(1, 95)} France {random.randint(100, 2_000_000)}")
+        elif kind < 0.95:
+            prompts.append(f"get city city-{random.randint(0, i)}")
+        elif kind < 0.999:
+            prompts.append(f"delete city-{i - 1}" if prompts[-1].startswith("add") else "get city nowhere")
+        else:
+            prompts.append("top 10")
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        t0 = time.perf_counter()
+        process_prompt_loop(Db([]), prompts)
+        loop = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for _ in execute_batch(Db([]), prompts):
+            pass
+        batch = time.perf_counter() - t0
+    print(f"replay {n} commands: loop {n / loop:.0f} cmd/s, execute_batch {n / batch:.0f} cmd/s")
+
+    adds = [prompt for prompt in prompts if prompt.startswith("add ")]
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        t0 = time.perf_counter()
+        process_prompt_loop(Db([]), adds)
+        loop = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for _ in execute_batch(Db([]), adds):
+            pass
+        batch = time.perf_counter() - t0
+    print(f"replay {len(adds)} adds: loop {len(adds) / loop:.0f} cmd/s, execute_batch {len(adds) / batch:.0f} cmd/s")
+
+    # A purge: runs of deletes against indexed dbs
+    cities = [City(f"city-{i}", random.randint(1, 95), "France", random.randint(100, 2_000_000)) for i in range(n)]
+    deletes = [f"delete city-{i}" for i in range(0, n, 10)] + [f"delete {department}" for department in range(1, 11)]
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        db = Db(cities, sorted_index=True, search_index=True)
+        t0 = time.perf_counter()
+        process_prompt_loop(db, deletes)
+        loop = time.perf_counter() - t0
+        db = Db(cities, sorted_index=True, search_index=True)
+        t0 = time.perf_counter()
+        for _ in execute_batch(db, deletes):
+            pass
+        batch = time.perf_counter() - t0
+    print(f"replay {len(deletes)} deletes on indexed db: loop {len(deletes) / loop:.0f} cmd/s, "
+          f"execute_batch {len(deletes) / batch:.0f} cmd/s")
+
+
+if __name__ == "__main__":
+    bench_insert()
+    bench_top()
+    bench_memory()
+    bench_load()
+    bench_flush()
+    bench_snapshot()
+    bench_search()
+    bench_cache()
+    bench_sharding()
+    bench_replay()
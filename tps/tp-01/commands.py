@@ -0,0 +1,143 @@
+from collections.abc import Callable, Iterable, Iterator
+
+from db import City, Db
+
+
+class CommandResult:
+    """Outcome of one command: its name, and the value it produced or the error it raised."""
+    __slots__ = ("command", "value", "error")
+
+    def __init__(self, command: str, value=None, error: str = None):
+        self.command = command
+        self.value = value
+        self.error = error
+
+    def __repr__(self):
+        return f"CommandResult({self.command!r}, {self.error if self.error is not None else self.value!r})"
+
+
+def parse_city(name: str, department_as_str: str, country: str, population_as_str: str) -> City:
+    return City(name, int(department_as_str), country, int(population_as_str))
+
+
+def get_city(db: Db, city: str):
+    return db[city]
+
+
+def get_department(db: Db, department_as_str: str) -> list[City]:
+    return db.list_in_department(int(department_as_str))
+
+
+def add(db: Db, *fields: str) -> City:
+    city = parse_city(*fields)
+    db.add(city)
+    return city
+
+
+def delete(db: Db, city_or_dep: str) -> str:
+    db.delete(city_or_dep)
+    return city_or_dep
+
+
+def flush(db: Db) -> str:
+    db.flush("./input.csv")
+    return "./input.csv"
+
+
+def top(db: Db, k: str) -> list[tuple[int, City]]:
+    return db.top(int(k))
+
+
+# First word of a command -> handler, or a table keyed by the second word.
+# Handlers are called with the db and the remaining words.
+COMMANDS: dict[str, Callable | dict[str, Callable]] = {
+    "get": {"city": get_city, "department": get_department},
+    "add": add,
+    "delete": delete,
+    "flush": flush,
+    "top": top,
+}
+
+
+def parse(prompt: str) -> tuple[str, Callable, list[str]] | None:
+    """Splits a prompt into (command name, handler, arguments), or None for an unknown command."""
+    words = prompt.split(" ")
+    handler = COMMANDS.get(words[0])
+    if type(handler) is dict:
+        if len(words) < 2 or words[1] not in handler:
+            return None
+        return f"{words[0]} {words[1]}", handler[words[1]], words[2:]
+    if handler is None:
+        return None
+    return words[0], handler, words[1:]
+
+
+def execute(db: Db, prompt: str) -> CommandResult | None:
+    """Runs one command without printing anything. Malformed commands raise, unknown ones return None."""
+    parsed = parse(prompt)
+    if parsed is None:
+        return None
+    command, handler, args = parsed
+    return CommandResult(command, handler(db, *args))
+
+
+# Shorter runs of adds are applied one by one, add_many only pays off on longer ones
+ADD_MANY_THRESHOLD = 16
+
+
+def execute_batch(db: Db, prompts: Iterable[str]) -> Iterator[CommandResult]:
+    """
+    Replays commands in order and yields one result per command. Consecutive adds
+    are applied together with Db.add_many, and consecutive deletes with
+    Db.delete_many; a bad command yields an error result instead of stopping the replay.
+    """
+    pending: list[City] = []
+    deletes: list[str] = []
+
+    def apply_pending():
+        if pending:
+            if len(pending) >= ADD_MANY_THRESHOLD:
+                db.add_many(pending)
+            else:
+                for city in pending:
+                    db.add(city)
+            results = [CommandResult("add", city) for city in pending]
+            pending.clear()
+            return results
+        if deletes:
+            missing = set(db.delete_many(deletes))
+            results = [
+                CommandResult("delete", error=f"KeyError: {city_or_dep!r}") if position in missing
+                else CommandResult("delete", city_or_dep)
+                for position, city_or_dep in enumerate(deletes)
+            ]
+            deletes.clear()
+            return results
+        return []
+
+    for prompt in prompts:
+        parsed = parse(prompt.rstrip("\n"))
+        if parsed is None:
+            yield from apply_pending()
+            yield CommandResult(prompt, error="unknown command")
+            continue
+
+        command, handler, args = parsed
+        try:
+            if handler is add:
+                city = parse_city(*args)
+                if deletes:
+                    yield from apply_pending()
+                pending.append(city)
+                continue
+            if handler is delete and len(args) == 1:
+                if pending:
+                    yield from apply_pending()
+                deletes.append(args[0])
+                continue
+            yield from apply_pending()
+            yield CommandResult(command, handler(db, *args))
+        except (TypeError, ValueError, KeyError) as e:
+            yield from apply_pending()  # the commands before the bad one come first
+            yield CommandResult(command, error=f"{type(e).__name__}: {e}")
+    yield from apply_pending()
@@ -0,0 +1,109 @@
+import threading
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+
+from db import City, Db
+
+
+class ReadWriteLock:
+    """
+    Any number of readers, or a single writer. Readers never wait on each
+    other, only on a writer; a waiting writer holds back new readers so a
+    steady stream of reads cannot starve it. Not reentrant.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.readers = 0
+        self.writer = False
+        self.waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self.condition:
+            while self.writer or self.waiting_writers:
+                self.condition.wait()
+            self.readers += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.readers -= 1
+                if not self.readers:
+                    self.condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self.condition:
+            self.waiting_writers += 1
+            while self.writer or self.readers:
+                self.condition.wait()
+            self.waiting_writers -= 1
+            self.writer = True
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.writer = False
+                self.condition.notify_all()
+
+
+class ThreadSafeDb(Db):
+    """
+    Db shared between threads: queries run concurrently under the read lock,
+    mutations one at a time under the write lock. Lazy results are read
+    before the lock is released, so they never see a half applied write.
+    Can be mixed in before another Db subclass, e.g. class X(ThreadSafeDb, PersistentDb).
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.lock = ReadWriteLock()
+        super().__init__(*args, **kwargs)
+
+    def add(self, city: City):
+        with self.lock.write():
+            super().add(city)
+
+    def add_many(self, cities: Iterable[City]):
+        # The batch is read before taking the lock, readers are not held back by a slow source
+        cities = list(cities)
+        with self.lock.write():
+            super().add_many(cities)
+
+    def delete(self, city_or_dep: str):
+        with self.lock.write():
+            super().delete(city_or_dep)
+
+    def delete_many(self, cities_or_deps: Iterable[str]) -> list[int]:
+        cities_or_deps = list(cities_or_deps)
+        with self.lock.write():
+            return super().delete_many(cities_or_deps)
+
+    def flush(self, *args, **kwargs):
+        # Exclusive: two flushes must not write the same file at once, and PersistentDb.flush rotates its log
+        with self.lock.write():
+            super().flush(*args, **kwargs)
+
+    def list_in_department(self, department: int) -> list[City]:
+        with self.lock.read():
+            return super().list_in_department(department)
+
+    def search_prefix(self, prefix: str, limit: int = None) -> Iterator[City]:
+        with self.lock.read():
+            return iter(list(super().search_prefix(prefix, limit)))
+
+    def search_fuzzy(self, query: str, limit: int = 10) -> Iterator[City]:
+        with self.lock.read():
+            return iter(list(super().search_fuzzy(query, limit)))
+
+    def population_between(self, low: int, high: int, limit: int = None) -> Iterator[City]:
+        with self.lock.read():
+            return iter(list(super().population_between(low, high, limit)))
+
+    def __getitem__(self, city_name: str):
+        with self.lock.read():
+            return super().__getitem__(city_name)
+
+    def top(self, k: int, department: int = None) -> list[tuple[int, City]]:
+        with self.lock.read():
+            return super().top(k, department)
@@ -1,6 +1,13 @@
-from queue import PriorityQueue
+import csv
+import heapq
+import sys
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections.abc import Iterable, Iterator, MutableMapping
+from itertools import islice
 
-from collections import defaultdict
+from collections import Counter, OrderedDict, defaultdict
 
 
 class City:
@@ -17,60 +24,450 @@ class City:
         return str(self)
 
 
+def population_key(city: City) -> tuple[int, str]:
+    # Ties on population are broken by name, City itself is not orderable
+    return city.population, city.name
+
+
+class PopulationIndex:
+    """Keys (population, name) kept sorted, so the k largest cities are the last k keys."""
+
+    def __init__(self):
+        self.keys: list[tuple[int, str]] = []
+
+    def add(self, city: City):
+        insort(self.keys, population_key(city))
+
+    def add_many(self, cities: Iterable[City]):
+        self.keys.extend(map(population_key, cities))
+        self.keys.sort()
+
+    def remove(self, city: City):
+        del self.keys[bisect_left(self.keys, population_key(city))]
+
+    def remove_many(self, cities: Iterable[City]):
+        """Removes a batch of cities with a single pass over the keys, instead of one shift per city."""
+        removed = set(map(population_key, cities))
+        if removed:
+            self.keys = [key for key in self.keys if key not in removed]
+
+    def largest(self, k: int) -> list[tuple[int, str]]:
+        return self.keys[-k:] if k > 0 else []
+
+    def between(self, low: int, high: int) -> Iterator[tuple[int, str]]:
+        """Keys with low <= population <= high, from the smallest population, read lazily."""
+        i = bisect_left(self.keys, (low,))
+        while i < len(self.keys) and self.keys[i][0] <= high:
+            yield self.keys[i]
+            i += 1
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def trigrams(name: str) -> set[str]:
+    padded = f"  {name.casefold()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """
+    Names kept sorted by their casefolded form for prefix search, and a
+    trigram -> names index for typo tolerant search.
+    """
+
+    def __init__(self):
+        self.keys: list[tuple[str, str]] = []
+        self.trigrams: dict[str, set[str]] = defaultdict(set)
+
+    def add(self, name: str):
+        insort(self.keys, (name.casefold(), name))
+        for trigram in trigrams(name):
+            self.trigrams[trigram].add(name)
+
+    def add_many(self, names: Iterable[str]):
+        names = list(names)
+        self.keys.extend((name.casefold(), name) for name in names)
+        self.keys.sort()
+        for name in names:
+            for trigram in trigrams(name):
+                self.trigrams[trigram].add(name)
+
+    def remove(self, name: str):
+        del self.keys[bisect_left(self.keys, (name.casefold(), name))]
+        self.__remove_trigrams(name)
+
+    def remove_many(self, names: Iterable[str]):
+        """Removes a batch of names with a single pass over the sorted keys."""
+        removed = set(names)
+        if removed:
+            self.keys = [key for key in self.keys if key[1] not in removed]
+            for name in removed:
+                self.__remove_trigrams(name)
+
+    def __remove_trigrams(self, name: str):
+        for trigram in trigrams(name):
+            names = self.trigrams[trigram]
+            names.discard(name)
+            if not names:
+                del self.trigrams[trigram]
+
+    def prefix(self, prefix: str) -> Iterator[str]:
+        """Names starting with prefix, ignoring case, in alphabetical order and read lazily."""
+        prefix = prefix.casefold()
+        i = bisect_left(self.keys, (prefix,))
+        while i < len(self.keys) and self.keys[i][0].startswith(prefix):
+            yield self.keys[i][1]
+            i += 1
+
+    def fuzzy(self, query: str, threshold: float = 0.3) -> Iterator[str]:
+        """Names sharing enough trigrams with query, the most similar first (Jaccard similarity)."""
+        query_trigrams = trigrams(query)
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(self.trigrams.get(trigram, ()))
+        # The similarity can only reach threshold if at least threshold * len(query_trigrams) are shared
+        minimum = threshold * len(query_trigrams)
+        scores = []
+        for name, count in shared.items():
+            if count < minimum:
+                continue
+            score = count / (len(query_trigrams) + len(trigrams(name)) - count)
+            if score >= threshold:
+                scores.append((-score, name))
+        scores.sort()
+        return (name for _, name in scores)
+
+
+class QueryCache:
+    """
+    Bounded LRU of query results, each stored with the version of the data it was
+    computed from: an entry whose version is no longer current counts as a miss.
+    """
+
+    MISSING = object()
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.entries: OrderedDict[tuple, tuple[int, object]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Queries of a ThreadSafeDb run concurrently, and a lookup reorders the entries
+        self.lock = threading.Lock()
+
+    def get(self, key: tuple, version: int):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return self.MISSING
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: tuple, version: int, value):
+        with self.lock:
+            self.entries[key] = (version, value)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class ColumnarCities(MutableMapping):
+    """
+    Name -> City mapping stored by column: departments, populations and country
+    codes live in typed arrays, names and countries are interned. A City is
+    only built when a row is read, and is a copy: mutate through the Db.
+    """
+
+    def __init__(self):
+        self.rows: dict[str, int] = dict()
+        self.names: list[str | None] = []
+        self.departments = array("i")
+        self.populations = array("q")
+        self.countries = array("H")
+        self.country_table: list[str] = []
+        self.country_codes: dict[str, int] = dict()
+        self.free_rows: list[int] = []
+
+    def __getitem__(self, name: str) -> City:
+        row = self.rows[name]
+        return City(self.names[row], self.departments[row], self.country_table[self.countries[row]],
+                    self.populations[row])
+
+    def __setitem__(self, name: str, city: City):
+        country = self.country_codes.get(city.country)
+        if country is None:
+            country = self.country_codes[city.country] = len(self.country_table)
+            self.country_table.append(sys.intern(city.country))
+
+        row = self.rows.get(name)
+        if row is None:
+            name = sys.intern(name)
+            if self.free_rows:
+                row = self.free_rows.pop()
+                self.names[row] = name
+            else:
+                row = len(self.names)
+                self.names.append(name)
+                self.departments.append(0)
+                self.populations.append(0)
+                self.countries.append(0)
+            self.rows[name] = row
+        self.departments[row] = city.department
+        self.populations[row] = city.population
+        self.countries[row] = country
+
+    def __delitem__(self, name: str):
+        row = self.rows.pop(name)
+        self.names[row] = None
+        self.free_rows.append(row)
+
+    def copy(self) -> "ColumnarCities":
+        """Copies the columns with C level copies, without building a single City."""
+        copy = ColumnarCities()
+        copy.rows = self.rows.copy()
+        copy.names = self.names.copy()
+        copy.departments = self.departments[:]
+        copy.populations = self.populations[:]
+        copy.countries = self.countries[:]
+        copy.country_table = self.country_table.copy()
+        copy.country_codes = self.country_codes.copy()
+        copy.free_rows = self.free_rows.copy()
+        return copy
+
+    def __contains__(self, name) -> bool:
+        return name in self.rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+
 class Db:
-    def __init__(self, db: list[City]):
-        self.cities: dict[str, City] = {city.name: city for city in db}
-        self.department_index = dict()
-        self.__update_index()
-        print("Successfully loaded ", len(db), "cities")
+    def __init__(self, db: Iterable[City], sorted_index: bool = False, columnar: bool = False,
+                 search_index: bool = False, cache_size: int = 0):
+        self.cities: MutableMapping[str, City] = ColumnarCities() if columnar else dict()
+        # department -> names of its cities (a dict used as an ordered set), so a city can be removed in O(1)
+        self.department_index: dict[int, dict[str, None]] = dict()
+        # Optional population indexes, global and per department, answering top(k) in O(k)
+        self.population_index = PopulationIndex() if sorted_index else None
+        self.department_population_index: dict[int, PopulationIndex] = dict()
+        # Optional prefix and fuzzy name search
+        self.name_index = NameIndex() if search_index else None
+        # Optional cache of list_in_department and top results. Every mutation bumps version, and
+        # stamps it on the departments it touched: a cached result is valid while its stamp is current
+        self.query_cache = QueryCache(cache_size) if cache_size > 0 else None
+        self.version = 0
+        self.department_versions: dict[int, int] = dict()
+        self.add_many(db)
+        print("Successfully loaded ", len(self.cities), "cities")
 
     def add(self, city: City):
+        old = self.cities.get(city.name)
+        if old is not None:
+            self.__unindex(old)
         self.cities[city.name] = city
-        self.__update_index()
+        self.department_index.setdefault(city.department, {})[city.name] = None
+        if self.population_index is not None:
+            self.population_index.add(city)
+            self.department_population_index.setdefault(city.department, PopulationIndex()).add(city)
+        if self.name_index is not None:
+            self.name_index.add(city.name)
+        self.__touch(city.department)
+
+    def add_many(self, cities: Iterable[City]):
+        """Adds a batch of cities, the department index is only touched once for the whole batch."""
+        added = defaultdict(dict)
+        replaced = []
+        for city in cities:
+            old = self.cities.get(city.name)
+            if old is not None:
+                if old.name in added.get(old.department, ()):  # already added by this batch
+                    del added[old.department][old.name]
+                else:
+                    replaced.append(old)
+            self.cities[city.name] = city
+            # Cities are only kept for the population index, columnar storage must not hold on to them
+            added[city.department][city.name] = city if self.population_index is not None else None
+
+        for old in replaced:
+            self.__unindex(old)
+        # The global indexes are sorted once for the whole batch
+        if self.population_index is not None:
+            self.population_index.add_many(
+                city for cities_in_department in added.values() for city in cities_in_department.values())
+        if self.name_index is not None:
+            self.name_index.add_many(name for cities_in_department in added.values() for name in cities_in_department)
+        for department, cities_in_department in added.items():
+            if cities_in_department:
+                self.department_index.setdefault(department, {}).update(dict.fromkeys(cities_in_department))
+                if self.population_index is not None:
+                    self.department_population_index.setdefault(department, PopulationIndex()).add_many(
+                        cities_in_department.values())
+            self.__touch(department)
 
     def delete(self, city_or_dep: str):
         if city_or_dep.isnumeric():  # department
             self.__delete_dep(int(city_or_dep))
             return
         self.__delete_city(city_or_dep)
-        self.__update_index()
+
+    def delete_many(self, cities_or_deps: Iterable[str]) -> list[int]:
+        """
+        Deletes a batch of cities and departments, in order, updating the global indexes once
+        for the whole batch. Returns the positions of the cities that were not found, where
+        delete would have raised KeyError.
+        """
+        removed: list[City] = []
+        missing = []
+        departments = set()
+        for position, city_or_dep in enumerate(cities_or_deps):
+            if city_or_dep.isnumeric():  # department
+                dep = int(city_or_dep)
+                removed.extend(self.cities.pop(name) for name in self.department_index.pop(dep, {}))
+                self.department_population_index.pop(dep, None)
+                departments.add(dep)
+            elif city_or_dep in self.cities:
+                city = self.cities.pop(city_or_dep)
+                removed.append(city)
+                department = self.department_index[city.department]
+                del department[city.name]
+                if not department:
+                    del self.department_index[city.department]
+                departments.add(city.department)
+            else:
+                missing.append(position)
+
+        if self.population_index is not None:
+            self.population_index.remove_many(removed)
+            by_department = defaultdict(list)
+            for city in removed:
+                by_department[city.department].append(city)
+            for department, cities in by_department.items():
+                index = self.department_population_index.get(department)
+                if index is not None:  # None when the whole department was deleted
+                    index.remove_many(cities)
+                    if not index:
+                        del self.department_population_index[department]
+        if self.name_index is not None:
+            self.name_index.remove_many(city.name for city in removed)
+        for department in departments:
+            self.__touch(department)
+        return missing
 
     def __delete_dep(self, dep):
-        for city in self.department_index[dep]:
-            self.__delete_city(city.name)
-        self.__update_index()
+        names = self.department_index.pop(dep, {})
+        removed = [self.cities.pop(name) for name in names]
+        if self.population_index is not None:
+            self.population_index.remove_many(removed)
+        if self.name_index is not None:
+            self.name_index.remove_many(names)
+        self.department_population_index.pop(dep, None)
+        self.__touch(dep)
 
     def __delete_city(self, city):
-        del self.cities[city]
+        self.__unindex(self.cities.pop(city))
+
+    def __unindex(self, city: City):
+        department = self.department_index[city.department]
+        del department[city.name]
+        if not department:
+            del self.department_index[city.department]
+        if self.population_index is not None:
+            self.population_index.remove(city)
+            self.department_population_index[city.department].remove(city)
+            if not self.department_population_index[city.department]:
+                del self.department_population_index[city.department]
+        if self.name_index is not None:
+            self.name_index.remove(city.name)
+        self.__touch(city.department)
+
+    def __touch(self, department: int):
+        if self.query_cache is not None:
+            # Versions are never reset, even once a department is empty: a stale entry could match again
+            self.version += 1
+            self.department_versions[department] = self.version
 
     def list_in_department(self, department: int) -> list[City]:
-        return self.department_index[department]
+        if self.query_cache is None:
+            return [self.cities[name] for name in self.department_index.get(department, ())]
+
+        key = ("department", department)
+        version = self.department_versions.get(department, 0)
+        cities = self.query_cache.get(key, version)
+        if cities is QueryCache.MISSING:
+            cities = [self.cities[name] for name in self.department_index.get(department, ())]
+            self.query_cache.put(key, version, cities)
+        return list(cities)  # the caller may modify its list
+
+    def search_prefix(self, prefix: str, limit: int = None) -> Iterator[City]:
+        """Cities whose name starts with prefix, ignoring case. Scans every city without search_index."""
+        if self.name_index is not None:
+            names = self.name_index.prefix(prefix)
+        else:
+            prefix = prefix.casefold()
+            names = (name for name in self.cities if name.casefold().startswith(prefix))
+        return islice(map(self.cities.__getitem__, names), limit)
+
+    def search_fuzzy(self, query: str, limit: int = 10) -> Iterator[City]:
+        """Cities whose name looks like query, the closest first. Requires search_index."""
+        if self.name_index is None:
+            raise RuntimeError("search_fuzzy needs a Db built with search_index=True")
+        return islice(map(self.cities.__getitem__, self.name_index.fuzzy(query)), limit)
+
+    def population_between(self, low: int, high: int, limit: int = None) -> Iterator[City]:
+        """Cities with low <= population <= high. Sorted by population with sorted_index, else a scan."""
+        if self.population_index is not None:
+            cities = (self.cities[name] for _, name in self.population_index.between(low, high))
+        else:
+            cities = (city for city in self.cities.values() if low <= city.population <= high)
+        return islice(cities, limit)
 
     def __getitem__(self, city_name: str):
         if city_name not in self.cities.keys():
             return "<Not Found>"
         return self.cities[city_name]
 
-    def __update_index(self):
-        self.department_index = defaultdict(list)
-        for city in self.cities.values():
-            self.department_index[city.department].append(city)
-
     def flush(self, path: str):
-        with open(path, "wt+") as fp:
+        with open(path, "wt+", newline="") as fp:
+            writer = csv.writer(fp, lineterminator="\n")  # quotes names containing commas
             for city in self.cities.values():
-                fp.write(f"{city.name},{city.department},{city.country},{city.population}\n")
+                writer.writerow((city.name, city.department, city.country, city.population))
 
         print(f"Successfully wrote {len(self.cities)} in {path}")
 
-    def top(self, k: int):
-        q = PriorityQueue()
-        for city in self.cities.values():
-            q.put((city.population, city))
-            if len(q.queue) > k:
-                q.get()
-
-        res = []
-        while len(q.queue):
-            res.append(q.get())
-        return res
+    def top(self, k: int, department: int = None) -> list[tuple[int, City]]:
+        """
+        The k most populated cities, in the whole db or in one department,
+        as (population, city) pairs from the smallest to the largest.
+        """
+        if self.query_cache is None:
+            return self.__top(k, department)
+
+        key = ("top", k, department)
+        version = self.version if department is None else self.department_versions.get(department, 0)
+        largest = self.query_cache.get(key, version)
+        if largest is QueryCache.MISSING:
+            largest = self.__top(k, department)
+            self.query_cache.put(key, version, largest)
+        return list(largest)
+
+    def __top(self, k: int, department: int = None) -> list[tuple[int, City]]:
+        if self.population_index is not None:
+            index = self.population_index if department is None else self.department_population_index.get(department)
+            if index is None:
+                return []
+            return [(population, self.cities[name]) for population, name in index.largest(k)]
+
+        if department is None:
+            cities = self.cities.values()
+        else:
+            cities = (self.cities[name] for name in self.department_index.get(department, ()))
+        largest = heapq.nlargest(k, cities, key=population_key)
+        return [(city.population, city) for city in reversed(largest)]
@@ -0,0 +1,66 @@
+import csv
+import io
+import multiprocessing
+import os
+from collections import deque
+from collections.abc import Iterator
+
+from db import City, Db
+
+CHUNK_SIZE = 16 * 2 ** 20
+# Below this size, starting the worker processes costs more than parsing the whole file
+PARALLEL_THRESHOLD = 64 * 2 ** 20
+
+
+def read_chunks(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Reads the file by blocks of about chunk_size bytes, each one ending on a full line."""
+    with open(path, "rb") as fp:
+        rest = b""
+        while block := fp.read(chunk_size):
+            block = rest + block
+            end = block.rfind(b"\n") + 1
+            rest = block[end:]
+            if end:
+                yield block[:end]
+        if rest:
+            yield rest
+
+
+def parse_chunk(chunk: bytes) -> list[tuple[str, int, str, int]]:
+    """
+    Parses a block of csv lines. Quoted fields, including names containing commas,
+    are handled by the csv module; a quoted field must not span several lines.
+    """
+    rows = []
+    for row in csv.reader(io.StringIO(chunk.decode())):
+        if row:
+            name, department_as_str, country, population_as_str = row
+            rows.append((name, int(department_as_str), country, int(population_as_str)))
+    return rows
+
+
+def iter_rows(path: str, processes: int = None, chunk_size: int = CHUNK_SIZE) -> Iterator[tuple[str, int, str, int]]:
+    """
+    Streams the rows of a city csv file, in file order. Big files are parsed by a
+    pool of processes, with a bounded number of chunks in flight so memory stays flat.
+    """
+    chunks = read_chunks(path, chunk_size)
+    if processes == 1 or (processes is None and os.path.getsize(path) < PARALLEL_THRESHOLD):
+        for chunk in chunks:
+            yield from parse_chunk(chunk)
+        return
+
+    in_flight = 2 * (processes or os.cpu_count() or 1)
+    with multiprocessing.Pool(processes) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(parse_chunk, (chunk,)))
+            if len(pending) >= in_flight:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+
+def load_db(path: str, processes: int = None, chunk_size: int = CHUNK_SIZE, **db_options) -> Db:
+    """Builds a Db straight from the csv file, without materializing the list of cities."""
+    return Db((City(*row) for row in iter_rows(path, processes, chunk_size)), **db_options)
@@ -0,0 +1,164 @@
+import csv
+import os
+import threading
+from collections.abc import Iterable, Iterator, Mapping
+
+from db import City, Db
+from loader import iter_rows
+
+
+class WriteAheadLog:
+    """
+    Append-only log of Db mutations, one csv record per line:
+    ("A", name, department, country, population) or ("D", city_or_dep).
+    Records are fsynced in groups of group_size, or on sync().
+    """
+
+    def __init__(self, path: str, group_size: int = 64):
+        self.path = path
+        self.group_size = group_size
+        self.fp = open(path, "a", newline="")
+        self.writer = csv.writer(self.fp, lineterminator="\n")
+        self.pending = 0
+        self.records = 0
+
+    def append(self, record: tuple):
+        self.writer.writerow(record)
+        self.pending += 1
+        self.records += 1
+        if self.pending >= self.group_size:
+            self.sync()
+
+    def sync(self):
+        if self.pending:
+            self.fp.flush()
+            os.fsync(self.fp.fileno())
+            self.pending = 0
+
+    def close(self):
+        self.sync()
+        self.fp.close()
+
+    @staticmethod
+    def replay(path: str) -> Iterator[list[str]]:
+        if not os.path.exists(path):
+            return
+        with open(path, "r", newline="") as fp:
+            yield from csv.reader(fp)
+
+
+class PersistentDb(Db):
+    """
+    Db persisted as a csv snapshot plus a write-ahead log. flush() only fsyncs the
+    records appended since the previous flush; once the log holds compact_every
+    records, it is rotated and folded into a new snapshot by a background thread.
+    On startup the snapshot is loaded, then the rotated log if a compaction was
+    interrupted, then the current log.
+    """
+
+    def __init__(self, path: str, group_size: int = 64, compact_every: int = 100_000, **db_options):
+        self.path = path
+        self.log_path = path + ".log"
+        self.rotated_log_path = path + ".log.1"
+        self.compact_every = compact_every
+        self.wal = None
+        self.compaction: threading.Thread | None = None
+
+        rows = iter_rows(path) if os.path.exists(path) else ()
+        super().__init__((City(*row) for row in rows), **db_options)
+        self.__replay(self.rotated_log_path)
+        replayed = self.__replay(self.log_path)
+        if os.path.exists(self.rotated_log_path):
+            # Interrupted compaction: finish it before the rotated log can be overwritten
+            self.__write_snapshot(self.cities)
+        self.wal = WriteAheadLog(self.log_path, group_size)
+        # Records left by previous sessions count towards the next compaction
+        self.wal.records = replayed
+        if self.wal.records >= self.compact_every:
+            self.compact()
+
+    def __replay(self, log_path: str) -> int:
+        # Replaying records already folded into the snapshot is harmless: adds overwrite,
+        # and each city ends up in the state set by the last record touching it
+        replayed = 0
+        for replayed, record in enumerate(WriteAheadLog.replay(log_path), 1):
+            match record:
+                case ["A", name, department, country, population]:
+                    super().add(City(name, int(department), country, int(population)))
+                case ["D", city_or_dep]:
+                    try:
+                        super().delete(city_or_dep)
+                    except KeyError:
+                        pass
+        return replayed
+
+    def add(self, city: City):
+        super().add(city)
+        if self.wal is not None:
+            self.wal.append(("A", city.name, city.department, city.country, city.population))
+
+    def add_many(self, cities: Iterable[City]):
+        if self.wal is None:
+            super().add_many(cities)
+            return
+
+        def logged():
+            for city in cities:
+                self.wal.append(("A", city.name, city.department, city.country, city.population))
+                yield city
+
+        super().add_many(logged())
+
+    def delete(self, city_or_dep: str):
+        super().delete(city_or_dep)
+        self.wal.append(("D", city_or_dep))
+
+    def delete_many(self, cities_or_deps: Iterable[str]) -> list[int]:
+        cities_or_deps = list(cities_or_deps)
+        missing = set(super().delete_many(cities_or_deps))
+        for position, city_or_dep in enumerate(cities_or_deps):
+            if position not in missing:
+                self.wal.append(("D", city_or_dep))
+        return sorted(missing)
+
+    def flush(self, path: str = None):
+        """Makes every mutation durable. path is accepted for compatibility with Db.flush and ignored."""
+        self.wal.sync()
+        if self.wal.records >= self.compact_every:
+            self.compact()
+
+    def compact(self, wait: bool = False):
+        """
+        Rotates the log and writes a new snapshot from a background thread. The only
+        foreground work is a shallow copy of the cities mapping: a dict copy, or the
+        column copies of ColumnarCities, both done in C. Rows are formatted and written
+        by the background thread.
+        """
+        if self.compaction is not None and self.compaction.is_alive():
+            if not wait:
+                return
+            self.compaction.join()
+
+        self.wal.close()
+        os.replace(self.log_path, self.rotated_log_path)
+        self.wal = WriteAheadLog(self.log_path, self.wal.group_size)
+        # Cities are never mutated in place, Db replaces them: a shallow copy is a consistent snapshot
+        self.compaction = threading.Thread(target=self.__write_snapshot, args=(self.cities.copy(),))
+        self.compaction.start()
+        if wait:
+            self.compaction.join()
+
+    def __write_snapshot(self, cities: Mapping[str, City]):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", newline="") as fp:
+            csv.writer(fp, lineterminator="\n").writerows(
+                (city.name, city.department, city.country, city.population) for city in cities.values())
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp_path, self.path)
+        os.remove(self.rotated_log_path)
+
+    def close(self):
+        if self.compaction is not None:
+            self.compaction.join()
+        self.wal.close()
@@ -0,0 +1,180 @@
+import heapq
+import multiprocessing
+import os
+from collections.abc import Callable, Iterable
+
+from db import City, Db, population_key
+from loader import load_db
+
+
+def shard_path(path: str, shard: int) -> str:
+    return f"{path}.{shard}"
+
+
+def serve(connection, path: str | None, db_options: dict):
+    """
+    Worker loop of a shard: owns a Db, loaded from path when the file exists, and
+    answers (function, args) requests with ("ok", function(db, *args)) or ("error", exception).
+    The first message sent is the list of names loaded, None stops the worker.
+    """
+    if path is not None and os.path.exists(path):
+        db = load_db(path, processes=1, **db_options)  # a daemon process cannot start a pool
+    else:
+        db = Db([], **db_options)
+    connection.send(("ok", list(db.cities)))
+    while (request := connection.recv()) is not None:
+        function, args = request
+        try:
+            connection.send(("ok", function(db, *args)))
+        except Exception as e:
+            connection.send(("error", e))
+
+
+def add_rows(db: Db, rows: list[tuple[str, int, str, int]]):
+    # Plain tuples are much cheaper to pickle than City objects
+    db.add_many(City(*row) for row in rows)
+
+
+def delete_department(db: Db, department: int) -> list[str]:
+    names = list(db.department_index.get(department, ()))
+    db.delete(str(department))
+    return names
+
+
+class ShardedDb:
+    """
+    Cities partitioned by department across worker processes, each one owning a Db.
+    Department queries go to the owning shard, top(k) asks every shard for its k
+    largest and merges them. The coordinator only keeps which shard owns each name.
+    With path, each shard starts from the file written by flush(path).
+    """
+
+    def __init__(self, db: Iterable[City] = (), shards: int = None, path: str = None, batch_size: int = 10_000,
+                 **db_options):
+        self.batch_size = batch_size
+        self.connections = []
+        self.processes = []
+        for shard in range(shards or os.cpu_count() or 1):
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=serve, args=(worker_connection, None if path is None else shard_path(path, shard), db_options),
+                daemon=True)
+            process.start()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+        # The shards load their files in parallel
+        self.locations: dict[str, int] = dict()
+        for shard, connection in enumerate(self.connections):
+            self.locations.update(dict.fromkeys(self.__receive(connection), shard))
+        self.add_many(db)
+
+    def shard_for(self, department: int) -> int:
+        return department % len(self.connections)
+
+    def __receive(self, connection):
+        status, result = connection.recv()
+        if status == "error":
+            raise result
+        return result
+
+    def __call(self, shard: int, function: Callable, *args):
+        self.connections[shard].send((function, args))
+        return self.__receive(self.connections[shard])
+
+    def __scatter(self, requests: dict[int, tuple]) -> dict[int, object]:
+        """Sends every shard its (function, *args) request, then collects the results."""
+        for shard, (function, *args) in requests.items():
+            self.connections[shard].send((function, args))
+        return {shard: self.__receive(self.connections[shard]) for shard in requests}
+
+    def add(self, city: City):
+        shard = self.shard_for(city.department)
+        old = self.locations.get(city.name)
+        if old is not None and old != shard:  # the city changed department
+            self.__call(old, Db.delete, city.name)
+        self.__call(shard, Db.add, city)
+        self.locations[city.name] = shard
+
+    def add_many(self, cities: Iterable[City]):
+        """Sends the cities to their shards by batches of batch_size, every shard indexing its part in parallel."""
+        batches: list[list[tuple]] = [[] for _ in self.connections]
+        buffered = 0
+        for city in cities:
+            shard = self.shard_for(city.department)
+            old = self.locations.get(city.name)
+            if old is not None and old != shard:
+                # Sent first, so the delete cannot overtake an add of the same city still buffered
+                self.__add_batches(batches)
+                buffered = 0
+                self.__call(old, Db.delete, city.name)
+            batches[shard].append((city.name, city.department, city.country, city.population))
+            self.locations[city.name] = shard
+            buffered += 1
+            if buffered >= self.batch_size:
+                self.__add_batches(batches)
+                buffered = 0
+        self.__add_batches(batches)
+
+    def __add_batches(self, batches: list[list[tuple]]):
+        self.__scatter({shard: (add_rows, batch) for shard, batch in enumerate(batches) if batch})
+        for batch in batches:
+            batch.clear()
+
+    def delete(self, city_or_dep: str):
+        if city_or_dep.isnumeric():  # department
+            department = int(city_or_dep)
+            for name in self.__call(self.shard_for(department), delete_department, department):
+                del self.locations[name]
+            return
+        self.__call(self.locations.pop(city_or_dep), Db.delete, city_or_dep)
+
+    def delete_many(self, cities_or_deps: Iterable[str]) -> list[int]:
+        """Same contract as Db.delete_many; every delete is a round trip to its shard."""
+        missing = []
+        for position, city_or_dep in enumerate(cities_or_deps):
+            try:
+                self.delete(city_or_dep)
+            except KeyError:
+                missing.append(position)
+        return missing
+
+    def list_in_department(self, department: int) -> list[City]:
+        return self.__call(self.shard_for(department), Db.list_in_department, department)
+
+    def __getitem__(self, city_name: str):
+        shard = self.locations.get(city_name)
+        if shard is None:
+            return "<Not Found>"
+        return self.__call(shard, Db.__getitem__, city_name)
+
+    def flush(self, path: str):
+        """Every shard writes its own file, shard_path(path, shard), at the same time."""
+        self.__scatter({shard: (Db.flush, shard_path(path, shard)) for shard in range(len(self.connections))})
+
+    def top(self, k: int, department: int = None) -> list[tuple[int, City]]:
+        """Same result as Db.top: the k largest of each shard, merged from the smallest to the largest."""
+        if department is not None:
+            return self.__call(self.shard_for(department), Db.top, k, department)
+        if k <= 0:
+            return []
+        largest = self.__scatter({shard: (Db.top, k) for shard in range(len(self.connections))})
+        merged = list(heapq.merge(*largest.values(), key=lambda pair: population_key(pair[1])))
+        return merged[-k:]
+
+    def __len__(self):
+        return len(self.locations)
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(None)
+        for process in self.processes:
+            process.join()
+        for connection in self.connections:
+            connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,263 @@
+import heapq
+import mmap
+import os
+import struct
+import zlib
+from array import array
+from collections.abc import Iterator
+
+from db import City, Db, population_key
+from loader import load_db
+
+MAGIC = b"CITYSNP1"
+# magic, rows, countries, name slots, departments, department slots, then the offset of each section
+SECTIONS = ("departments", "populations", "countries", "name_offsets", "names",
+            "country_offsets", "country_names", "name_table",
+            "department_keys", "department_starts", "department_counts", "department_rows", "department_table")
+HEADER = struct.Struct("<8s5I" + "Q" * len(SECTIONS))
+
+
+def table_size(n: int) -> int:
+    """Open addressing tables are at most half full, with a power of two size."""
+    size = 1
+    while size < 2 * n:
+        size *= 2
+    return size
+
+
+def name_hash(name: bytes) -> int:
+    # Stable across processes, unlike hash()
+    return zlib.crc32(name)
+
+
+def department_hash(department: int) -> int:
+    return (department * 2654435761) & 0xFFFFFFFF
+
+
+def build_table(keys: list, hash_function, size: int) -> array:
+    """Slot -> position of the key + 1, 0 for an empty slot; collisions probe the next slot."""
+    table = array("i", bytes(4 * size))
+    mask = size - 1
+    for position, key in enumerate(keys):
+        slot = hash_function(key) & mask
+        while table[slot]:
+            slot = (slot + 1) & mask
+        table[slot] = position + 1
+    return table
+
+
+class Snapshot:
+    """
+    Read-only city database backed by a memory-mapped binary file: fixed-width
+    columns, a string heap and prebuilt hash indexes for names and departments.
+    Opening only parses the header, lookups read the pages they need, and every
+    process opening the same file shares the same pages.
+    """
+
+    @staticmethod
+    def write(db: Db, path: str):
+        names, departments, populations, countries = [], array("i"), array("q"), array("H")
+        country_codes: dict[str, int] = dict()
+        by_department: dict[int, array] = dict()
+        for row, city in enumerate(db.cities.values()):
+            names.append(city.name.encode())
+            departments.append(city.department)
+            populations.append(city.population)
+            countries.append(country_codes.setdefault(city.country, len(country_codes)))
+            by_department.setdefault(city.department, array("i")).append(row)
+
+        name_offsets = array("Q", [0])
+        for name in names:
+            name_offsets.append(name_offsets[-1] + len(name))
+        country_names = [country.encode() for country in country_codes]
+        country_offsets = array("Q", [0])
+        for country in country_names:
+            country_offsets.append(country_offsets[-1] + len(country))
+
+        department_keys = array("i", by_department)
+        department_starts, department_counts, department_rows = array("I"), array("I"), array("i")
+        for rows in by_department.values():
+            department_starts.append(len(department_rows))
+            department_counts.append(len(rows))
+            department_rows.extend(rows)
+
+        name_slots = table_size(len(names))
+        department_slots = table_size(len(department_keys))
+        sections = {
+            "departments": departments.tobytes(),
+            "populations": populations.tobytes(),
+            "countries": countries.tobytes(),
+            "name_offsets": name_offsets.tobytes(),
+            "names": b"".join(names),
+            "country_offsets": country_offsets.tobytes(),
+            "country_names": b"".join(country_names),
+            "name_table": build_table(names, name_hash, name_slots).tobytes(),
+            "department_keys": department_keys.tobytes(),
+            "department_starts": department_starts.tobytes(),
+            "department_counts": department_counts.tobytes(),
+            "department_rows": department_rows.tobytes(),
+            "department_table": build_table(list(department_keys), department_hash, department_slots).tobytes(),
+        }
+
+        offsets = []
+        position = HEADER.size
+        for name in SECTIONS:
+            position += -position % 8  # every column is 8 bytes aligned
+            offsets.append(position)
+            position += len(sections[name])
+
+        # Written aside then renamed: a reader never maps a half-written snapshot
+        with open(path + ".tmp", "wb") as fp:
+            fp.write(HEADER.pack(MAGIC, len(names), len(country_names), name_slots, len(department_keys),
+                                 department_slots, *offsets))
+            for name, offset in zip(SECTIONS, offsets):
+                fp.write(bytes(offset - fp.tell()))
+                fp.write(sections[name])
+        os.replace(path + ".tmp", path)
+
+    def __init__(self, path: str):
+        with open(path, "rb") as fp:
+            self.map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size, countries, name_slots, departments, department_slots, *offsets = \
+            HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a city snapshot")
+
+        view = memoryview(self.map)
+        lengths = {
+            "departments": (self.size, "i"), "populations": (self.size, "q"), "countries": (self.size, "H"),
+            "name_offsets": (self.size + 1, "Q"), "country_offsets": (countries + 1, "Q"),
+            "name_table": (name_slots, "i"),
+            "department_keys": (departments, "i"), "department_starts": (departments, "I"),
+            "department_counts": (departments, "I"), "department_rows": (self.size, "i"),
+            "department_table": (department_slots, "i"),
+        }
+        for name, offset in zip(SECTIONS, offsets):
+            if name in lengths:
+                count, fmt = lengths[name]
+                setattr(self, name, view[offset:offset + count * struct.calcsize(fmt)].cast(fmt))
+        self.names_start = offsets[SECTIONS.index("names")]
+        country_start = offsets[SECTIONS.index("country_names")]
+        # A handful of countries: decoded once
+        self.country_table = [
+            bytes(view[country_start + self.country_offsets[i]:country_start + self.country_offsets[i + 1]]).decode()
+            for i in range(countries)
+        ]
+
+    def __name(self, row: int) -> bytes:
+        return self.map[self.names_start + self.name_offsets[row]:self.names_start + self.name_offsets[row + 1]]
+
+    def __row(self, city_name: str) -> int:
+        name = city_name.encode()
+        mask = len(self.name_table) - 1
+        slot = name_hash(name) & mask
+        while entry := self.name_table[slot]:
+            if self.__name(entry - 1) == name:
+                return entry - 1
+            slot = (slot + 1) & mask
+        return -1
+
+    def city(self, row: int) -> City:
+        return City(self.__name(row).decode(), self.departments[row], self.country_table[self.countries[row]],
+                    self.populations[row])
+
+    def __getitem__(self, city_name: str):
+        row = self.__row(city_name)
+        if row < 0:
+            return "<Not Found>"
+        return self.city(row)
+
+    def __contains__(self, city_name: str) -> bool:
+        return self.__row(city_name) >= 0
+
+    def list_in_department(self, department: int) -> list[City]:
+        mask = len(self.department_table) - 1
+        slot = department_hash(department) & mask
+        while entry := self.department_table[slot]:
+            if self.department_keys[entry - 1] == department:
+                start = self.department_starts[entry - 1]
+                rows = self.department_rows[start:start + self.department_counts[entry - 1]]
+                return [self.city(row) for row in rows]
+            slot = (slot + 1) & mask
+        return []
+
+    def cities(self) -> Iterator[City]:
+        return map(self.city, range(self.size))
+
+    def top(self, k: int) -> list[tuple[int, City]]:
+        """Same result as Db.top(k), found with one pass over the populations column."""
+        if k <= 0 or not self.size:
+            return []
+        # Every city at the threshold is a candidate, so that ties are broken by name as in Db
+        threshold = heapq.nlargest(k, self.populations)[-1]
+        rows = [row for row, population in enumerate(self.populations) if population >= threshold]
+        largest = sorted(map(self.city, rows), key=population_key)[-k:]
+        return [(city.population, city) for city in largest]
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        for name in SECTIONS:
+            if hasattr(self, name):
+                getattr(self, name).release()
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class SnapshotDb:
+    """
+    A Db opened from a snapshot. get city, get department and top are answered from
+    the mapped file; the full Db is only built, from the snapshot rows rather than
+    the csv, by the first command that needs it (a mutation, flush, a search...).
+    """
+
+    def __init__(self, snapshot: Snapshot, **db_options):
+        self.snapshot = snapshot
+        self.db_options = db_options
+        self.db: Db | None = None
+
+    def load(self) -> Db:
+        if self.db is None:
+            self.db = Db(self.snapshot.cities(), **self.db_options)
+            self.snapshot.close()
+        return self.db
+
+    def __getitem__(self, city_name: str):
+        return self.snapshot[city_name] if self.db is None else self.db[city_name]
+
+    def list_in_department(self, department: int) -> list[City]:
+        if self.db is None:
+            return self.snapshot.list_in_department(department)
+        return self.db.list_in_department(department)
+
+    def top(self, k: int, department: int = None) -> list[tuple[int, City]]:
+        if self.db is None and department is None:
+            return self.snapshot.top(k)
+        return self.load().top(k, department)
+
+    def __getattr__(self, name: str):
+        return getattr(self.load(), name)
+
+
+def open_db(csv_path: str, snapshot_path: str, **db_options) -> Db | SnapshotDb:
+    """
+    Opens the snapshot when it is at least as recent as the csv. Otherwise loads the
+    csv and writes the snapshot for the next start; failing to write it is not an error.
+    """
+    try:
+        if os.stat(snapshot_path).st_mtime_ns >= os.stat(csv_path).st_mtime_ns:
+            return SnapshotDb(Snapshot(snapshot_path), **db_options)
+    except (OSError, ValueError, struct.error):  # missing, unreadable or not a snapshot
+        pass
+    db = load_db(csv_path, **db_options)
+    try:
+        Snapshot.write(db, snapshot_path)
+    except OSError as e:
+        print(f"Could not write {snapshot_path}: {e}")
+    return db
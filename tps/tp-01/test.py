@@ -0,0 +1,528 @@
+import os
+import sys
+import threading
+from unittest import mock
+
+import pytest
+
+from commands import *
+from concurrency import *
+from db import *
+from loader import *
+from persistence import *
+from sharding import *
+from snapshot import *
+
+
+@pytest.fixture(params=[False, True], ids=["dict", "columnar"])
+def columnar(request) -> bool:
+    return request.param
+
+
+def make_db(**kwargs) -> Db:
+    return Db([
+        City("Annecy", 74, "France", 1569817),
+        City("Toulon", 83, "France", 1472083),
+        City("Hyeres", 83, "France", 55000),
+        City("Rennes", 35, "France", 806639),
+    ], **kwargs)
+
+
+def test_department_index_is_incremental(columnar):
+    db = make_db(columnar=columnar)
+    db.add(City("Frejus", 83, "France", 53000))
+    assert [city.name for city in db.list_in_department(83)] == ["Toulon", "Hyeres", "Frejus"]
+
+    db.add(City("Frejus", 6, "France", 53000))  # moved to another department
+    assert [city.name for city in db.list_in_department(83)] == ["Toulon", "Hyeres"]
+    assert [city.name for city in db.list_in_department(6)] == ["Frejus"]
+
+    db.delete("Toulon")
+    assert [city.name for city in db.list_in_department(83)] == ["Hyeres"]
+    db.delete("Hyeres")
+    assert db.list_in_department(83) == []
+    assert 83 not in db.department_index
+
+
+def test_delete_department(columnar):
+    db = make_db(columnar=columnar)
+    db.delete("83")
+    assert db["Toulon"] == "<Not Found>"
+    assert db.list_in_department(83) == []
+    assert sorted(db.cities) == ["Annecy", "Rennes"]
+
+
+def test_add_many(columnar):
+    db = make_db(columnar=columnar)
+    db.add_many([
+        City("Lyon", 69, "France", 500000),
+        City("Annecy", 73, "France", 1),
+        City("Lyon", 69, "France", 520000),
+    ])
+    assert db["Lyon"].population == 520000
+    assert [city.name for city in db.list_in_department(69)] == ["Lyon"]
+    assert db.list_in_department(74) == []
+    assert [city.name for city in db.list_in_department(73)] == ["Annecy"]
+
+
+@pytest.mark.parametrize("sorted_index", [False, True])
+def test_top(columnar, sorted_index):
+    db = make_db(columnar=columnar, sorted_index=sorted_index)
+    db.add(City("Frejus", 83, "France", 55000))  # same population as Hyeres
+    assert [(population, city.name) for population, city in db.top(3)] == [
+        (806639, "Rennes"), (1472083, "Toulon"), (1569817, "Annecy")
+    ]
+    assert [city.name for _, city in db.top(3, department=83)] == ["Frejus", "Hyeres", "Toulon"]
+    assert [city.name for _, city in db.top(1, department=83)] == ["Toulon"]
+    assert db.top(0) == []
+    assert db.top(5, department=1) == []
+
+    db.delete("Toulon")
+    db.add_many([City("Nice", 6, "France", 340000), City("Hyeres", 83, "France", 56000)])
+    assert [city.name for _, city in db.top(2, department=83)] == ["Frejus", "Hyeres"]
+    db.delete("83")
+    assert [city.name for _, city in db.top(10)] == ["Nice", "Rennes", "Annecy"]
+    assert db.top(3, department=83) == []
+
+
+def test_population_index_batches(columnar):
+    cities = [City(f"Town-{i}", i % 5, "France", i * 7 % 100) for i in range(100)]
+    db = Db(cities, columnar=columnar, sorted_index=True)
+    db.add_many([City("Town-3", 1, "France", 1000), City("Bourg", 2, "France", 50)])
+    db.delete("3")
+    expected = sorted((city.population, city.name) for city in db.cities.values())
+    assert db.population_index.keys == expected
+    assert [(population, city.name) for population, city in db.top(2)] == expected[-2:]
+    assert db.department_population_index.keys() == {0, 1, 2, 4}
+
+
+def test_columnar_storage():
+    db = make_db(columnar=True)
+    assert isinstance(db.cities, ColumnarCities)
+    assert str(db["Toulon"]) == str(City("Toulon", 83, "France", 1472083))
+    db.delete("Toulon")
+    db.add(City("Lyon", 69, "Italia", 500000))
+    assert db.cities.rows["Lyon"] == 1  # row freed by Toulon is reused
+    assert db.cities.country_table == ["France", "Italia"]
+    assert sorted(db.cities) == ["Annecy", "Hyeres", "Lyon", "Rennes"]
+
+
+def test_loader(tmp_path):
+    path = tmp_path / "cities.csv"
+    db = make_db()
+    db.add(City("Saint-Martin, Paris", 75, "France", 1000))
+    db.flush(str(path))
+    assert '"Saint-Martin, Paris",75,France,1000\n' in path.read_text()
+
+    for processes in (1, 2):
+        loaded = load_db(str(path), processes=processes, chunk_size=16)
+        assert sorted(loaded.cities) == sorted(db.cities)
+        assert loaded["Saint-Martin, Paris"].population == 1000
+        assert [city.name for city in loaded.list_in_department(83)] == ["Toulon", "Hyeres"]
+
+
+def test_read_chunks_end_on_full_lines(tmp_path):
+    path = tmp_path / "cities.csv"
+    path.write_bytes(b"a,1,France,10\nbb,2,France,20\nc,3,France,30")
+    chunks = list(read_chunks(str(path), chunk_size=5))
+    assert b"".join(chunks) == path.read_bytes()
+    assert all(chunk.endswith(b"\n") for chunk in chunks[:-1])
+
+
+def test_write_ahead_log(tmp_path):
+    path = str(tmp_path / "cities.csv")
+    db = PersistentDb(path, group_size=2)
+    db.add_many(make_db().cities.values())
+    db.delete("Toulon")
+    db.add(City("Lyon", 69, "France", 500000))
+    db.flush()
+    assert not os.path.exists(path)  # nothing rewritten, only the log grows
+    assert sum(1 for _ in open(path + ".log")) == 6
+    db.close()
+
+    db = PersistentDb(path)
+    assert sorted(db.cities) == ["Annecy", "Hyeres", "Lyon", "Rennes"]
+    db.delete("83")
+    db.compact(wait=True)
+    assert os.path.getsize(path + ".log") == 0
+    assert not os.path.exists(path + ".log.1")
+    db.add(City("Nice", 6, "France", 340000))
+    db.close()
+
+    db = PersistentDb(path)
+    assert sorted(db.cities) == ["Annecy", "Lyon", "Nice", "Rennes"]
+    assert [city.name for city in db.list_in_department(69)] == ["Lyon"]
+    db.close()
+
+
+def test_compaction_snapshot_is_frozen(tmp_path, columnar):
+    path = str(tmp_path / "cities.csv")
+    db = PersistentDb(path, columnar=columnar)
+    db.add_many(make_db().cities.values())
+    started = threading.Event()
+    resume = threading.Event()
+    write_snapshot = db._PersistentDb__write_snapshot
+
+    def slow_write(cities):
+        started.set()
+        resume.wait()
+        write_snapshot(cities)
+
+    with mock.patch.object(db, "_PersistentDb__write_snapshot", slow_write):
+        db.compact()
+        started.wait()
+        # Mutations made while the snapshot is written stay out of it, and go to the new log
+        db.add(City("Annecy", 74, "France", 1))
+        db.delete("Toulon")
+        db.add(City("Nice", 6, "France", 340000))
+        resume.set()
+        db.compaction.join()
+    with open(path) as fp:
+        assert sorted(fp) == ["Annecy,74,France,1569817\n", "Hyeres,83,France,55000\n",
+                              "Rennes,35,France,806639\n", "Toulon,83,France,1472083\n"]
+    db.close()
+
+    db = PersistentDb(path, columnar=columnar)
+    assert sorted(db.cities) == ["Annecy", "Hyeres", "Nice", "Rennes"]
+    assert db["Annecy"].population == 1
+    db.close()
+
+
+def test_compaction_counts_replayed_records(tmp_path):
+    path = str(tmp_path / "cities.csv")
+    for session in range(2):
+        db = PersistentDb(path, compact_every=10)
+        for i in range(8):
+            db.add(City(f"Town-{session}-{i}", 1, "France", i))
+        db.flush()  # the second session reaches 16 records and compacts
+        db.close()
+
+    assert os.path.exists(path)  # 16 records over two sessions reached compact_every
+    assert sum(1 for _ in open(path + ".log")) < 10
+    db = PersistentDb(path, compact_every=10)
+    assert len(db.cities) == 16
+    db.close()
+
+
+def test_snapshot(tmp_path, columnar):
+    path = str(tmp_path / "cities.snap")
+    db = make_db(columnar=columnar)
+    db.add(City("Orléans", 45, "France", 116000))
+    db.add(City("Torino", 1, "Italia", 850000))
+    Snapshot.write(db, path)
+
+    with Snapshot(path) as snapshot:
+        assert len(snapshot) == 6
+        for name in db.cities:
+            assert str(snapshot[name]) == str(db[name])
+        assert snapshot["Paris"] == "<Not Found>"
+        assert "Orléans" in snapshot
+        assert [city.name for city in snapshot.list_in_department(83)] == ["Toulon", "Hyeres"]
+        assert snapshot.list_in_department(12) == []
+        assert snapshot["Torino"].country == "Italia"
+
+
+def test_open_db_from_snapshot(tmp_path):
+    csv_path, snapshot_path = str(tmp_path / "input.csv"), str(tmp_path / "input.snap")
+    expected = make_db()
+    expected.add(City("Draguignan", 83, "France", 55000))
+    expected.flush(csv_path)
+
+    db = open_db(csv_path, snapshot_path)
+    assert type(db) is Db
+    assert os.path.exists(snapshot_path)
+
+    db = open_db(csv_path, snapshot_path)
+    assert type(db) is SnapshotDb
+    with mock.patch("snapshot.load_db") as load:
+        assert str(db["Toulon"]) == str(expected["Toulon"])
+        assert [city.name for city in db.list_in_department(83)] == ["Toulon", "Hyeres", "Draguignan"]
+        for k in (0, 1, 2, 3, 10):
+            assert [(population, city.name) for population, city in db.top(k)] == \
+                   [(population, city.name) for population, city in expected.top(k)]
+        assert db.db is None
+        load.assert_not_called()
+
+    execute(db, "add Nice 6 France 342669")
+    assert type(db.db) is Db
+    assert db["Nice"].population == 342669
+    assert db.top(1)[0][1].name == "Annecy"
+    db.flush(csv_path)
+    stat = os.stat(snapshot_path)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    db = open_db(csv_path, snapshot_path)
+    assert type(db) is Db
+    assert "Nice" in Snapshot(snapshot_path)
+
+
+def test_open_db_with_broken_snapshot(tmp_path):
+    csv_path, snapshot_path = str(tmp_path / "input.csv"), str(tmp_path / "input.snap")
+    make_db().flush(csv_path)
+    with open(snapshot_path, "wb") as fp:
+        fp.write(b"CITY")
+    assert type(open_db(csv_path, snapshot_path)) is Db
+    with Snapshot(snapshot_path) as snapshot:
+        assert len(snapshot) == 4
+
+
+def test_empty_snapshot(tmp_path):
+    path = str(tmp_path / "cities.snap")
+    Snapshot.write(Db([]), path)
+    with Snapshot(path) as snapshot:
+        assert len(snapshot) == 0
+        assert snapshot["Paris"] == "<Not Found>"
+        assert snapshot.list_in_department(83) == []
+
+
+@pytest.mark.parametrize("search_index", [False, True])
+def test_search_prefix(columnar, search_index):
+    db = make_db(columnar=columnar, search_index=search_index)
+    db.add_many([City("Toulouse", 31, "France", 471941), City("tours", 37, "France", 136463)])
+    assert sorted(city.name for city in db.search_prefix("TOU")) == ["Toulon", "Toulouse", "tours"]
+    assert len(list(db.search_prefix("tou", limit=2))) == 2
+    db.delete("Toulon")
+    db.delete("31")
+    assert [city.name for city in db.search_prefix("tou")] == ["tours"]
+    assert list(db.search_prefix("x")) == []
+
+
+def test_name_index_batches(columnar):
+    db = Db([City(f"Town-{i}", i % 5, "France", i) for i in range(50)], columnar=columnar, search_index=True)
+    db.delete("3")
+    assert db.name_index.keys == sorted((name.casefold(), name) for name in db.cities)
+    assert [city.name for city in db.search_prefix("town-3")] == ["Town-30", "Town-31", "Town-32", "Town-34",
+                                                                 "Town-35", "Town-36", "Town-37", "Town-39"]
+    assert "Town-13" not in set().union(*db.name_index.trigrams.values())
+
+
+def test_search_fuzzy(columnar):
+    db = make_db(columnar=columnar, search_index=True)
+    db.add(City("Toulouse", 31, "France", 471941))
+    assert [city.name for city in db.search_fuzzy("Tolouse")][0] == "Toulouse"
+    assert [city.name for city in db.search_fuzzy("annecyy", limit=1)] == ["Annecy"]
+    db.delete("Annecy")
+    assert [city.name for city in db.search_fuzzy("annecyy")] == []
+    with pytest.raises(RuntimeError):
+        make_db().search_fuzzy("Annecy")
+
+
+@pytest.mark.parametrize("sorted_index", [False, True])
+def test_population_between(columnar, sorted_index):
+    db = make_db(columnar=columnar, sorted_index=sorted_index)
+    db.add(City("Frejus", 83, "France", 806639))
+    names = [city.name for city in db.population_between(50_000, 1_000_000)]
+    assert sorted(names) == ["Frejus", "Hyeres", "Rennes"]
+    assert len(list(db.population_between(0, 10 ** 9, limit=2))) == 2
+    assert list(db.population_between(10, 20)) == []
+
+
+def test_execute_batch(columnar):
+    db = make_db(columnar=columnar)
+    with mock.patch.object(db, "add_many", wraps=db.add_many) as add_many:
+        list(execute_batch(db, [f"add Village-{i} 12 France {i}" for i in range(20)]))
+        assert add_many.call_count == 1
+        assert len(db.list_in_department(12)) == 20
+        db.delete("12")
+
+        results = list(execute_batch(db, [
+            "add Lyon 69 France 500000",
+            "add Nice 6 France 340000",
+            "get city Lyon",
+            "get department 83",
+            "add Oops 12 France many",
+            "delete 83",
+            "top 2",
+            "hello",
+        ]))
+        assert add_many.call_count == 1  # too few adds to be worth a batch
+
+    assert [result.command for result in results] == [
+        "add", "add", "get city", "get department", "add", "delete", "top", "hello"
+    ]
+    assert results[2].value.population == 500000
+    assert [city.name for city in results[3].value] == ["Toulon", "Hyeres"]
+    assert results[4].error.startswith("ValueError")
+    assert [city.name for _, city in results[6].value] == ["Rennes", "Annecy"]
+    assert results[7].error == "unknown command"
+    assert db["Toulon"] == "<Not Found>"
+
+
+def test_execute_batch_keeps_order_around_errors():
+    results = list(execute_batch(make_db(), ["add A 1 FR 10", "add B 1 FR x", "add C 1 FR 5"]))
+    assert [result.command for result in results] == ["add", "add", "add"]
+    assert results[0].value.name == "A"
+    assert results[1].error.startswith("ValueError")
+    assert results[2].value.name == "C"
+
+
+@pytest.mark.parametrize("sorted_index", [False, True])
+def test_execute_batch_groups_deletes(columnar, sorted_index):
+    db = make_db(columnar=columnar, sorted_index=sorted_index, search_index=True)
+    db.add(City("Nice", 6, "France", 340000))
+    with mock.patch.object(db, "delete_many", wraps=db.delete_many) as delete_many:
+        results = list(execute_batch(db, [
+            "delete Nice", "delete Paris", "delete Toulon", "delete Nice", "delete 35", "get city Annecy",
+            "delete 83", "add Lyon 69 France 500000", "delete Lyon",
+        ]))
+        assert delete_many.call_count == 3
+
+    assert [(result.command, getattr(result.value, "name", result.value), result.error) for result in results] == [
+        ("delete", "Nice", None), ("delete", None, "KeyError: 'Paris'"), ("delete", "Toulon", None),
+        ("delete", None, "KeyError: 'Nice'"), ("delete", "35", None), ("get city", "Annecy", None),
+        ("delete", "83", None), ("add", "Lyon", None), ("delete", "Lyon", None),
+    ]
+    assert list(db.cities) == ["Annecy"]
+    assert db.department_index == {74: {"Annecy": None}}
+    assert [city.name for _, city in db.top(5)] == ["Annecy"]
+    assert [city.name for city in db.search_prefix("")] == ["Annecy"]
+    if sorted_index:
+        assert list(db.department_population_index) == [74]
+
+
+def test_persistent_delete_many(tmp_path):
+    path = str(tmp_path / "cities.csv")
+    db = PersistentDb(path)
+    db.add_many(make_db().cities.values())
+    assert db.delete_many(["Toulon", "Paris", "35", "Toulon"]) == [1, 3]
+    db.close()
+    assert sorted(PersistentDb(path).cities) == ["Annecy", "Hyeres"]
+
+
+def test_execute_does_not_print(capsys):
+    db = make_db()
+    capsys.readouterr()
+    assert execute(db, "top 1").value[0][1].name == "Annecy"
+    assert execute(db, "get town Paris") is None
+    with pytest.raises(TypeError):
+        execute(db, "get city Le Mans")
+    assert capsys.readouterr().out == ""
+
+
+@pytest.mark.parametrize("sorted_index", [False, True])
+def test_query_cache(columnar, sorted_index):
+    db = make_db(columnar=columnar, sorted_index=sorted_index, cache_size=8)
+    cache = db.query_cache
+
+    assert [city.name for city in db.list_in_department(83)] == ["Toulon", "Hyeres"]
+    db.list_in_department(83).clear()  # a copy, the cached list is untouched
+    assert [city.name for _, city in db.top(2)] == ["Toulon", "Annecy"]
+    assert db.top(2, department=74)[0][1].name == "Annecy"
+    assert (cache.hits, cache.misses) == (1, 3)
+
+    # Only the department that changed, and the global top, are recomputed
+    db.add(City("Frejus", 83, "France", 2_000_000))
+    assert [city.name for city in db.list_in_department(83)] == ["Toulon", "Hyeres", "Frejus"]
+    assert db.top(2, department=74)[0][1].name == "Annecy"
+    assert [city.name for _, city in db.top(2)] == ["Annecy", "Frejus"]
+    assert (cache.hits, cache.misses) == (2, 5)
+
+    db.delete("Annecy")
+    assert db.top(2, department=74) == []
+    db.delete("83")
+    assert db.list_in_department(83) == []
+    assert [city.name for _, city in db.top(2)] == ["Rennes"]
+    db.add(City("Toulon", 83, "France", 1))
+    assert [city.name for city in db.list_in_department(83)] == ["Toulon"]
+    db.add_many([City(f"Village-{i}", 12, "France", i) for i in range(10)])
+    assert [population for population, _ in db.top(2)] == [9, 806639]
+    assert len(cache) <= 8
+
+
+def test_query_cache_is_bounded():
+    db = make_db(cache_size=2)
+    for department in (74, 83, 35, 74):
+        db.list_in_department(department)
+    assert len(db.query_cache) == 2
+    assert db.query_cache.hits == 0
+
+
+def test_readers_do_not_wait_on_readers():
+    lock = ReadWriteLock()
+    entered = threading.Event()
+
+    def read():
+        with lock.read():
+            entered.set()
+
+    with lock.read():
+        threading.Thread(target=read).start()
+        assert entered.wait(1)
+
+
+def test_thread_safe_db_stress(columnar):
+    db = ThreadSafeDb([City(f"Town-{i}", i % 10, "France", i) for i in range(1000)],
+                      columnar=columnar, sorted_index=True, search_index=True)
+    batch = [City(f"New-{i}", 99, "France", 10 ** 6 + i) for i in range(50)]
+    stop = threading.Event()
+    errors = []
+
+    def writer():
+        try:
+            for _ in range(100):
+                db.add_many(batch)
+                db.add(City("Town-1", 1, "France", 1))
+                db.delete("99")
+        except Exception as e:
+            errors.append(e)
+        stop.set()
+
+    def reader():
+        try:
+            while not stop.is_set():
+                # A batch is applied at once: a reader sees all of it or none of it
+                assert len(db.list_in_department(99)) in (0, 50)
+                top = db.top(5)
+                assert [population for population, _ in top] == sorted(population for population, _ in top)
+                assert len(list(db.search_prefix("New-1"))) in (0, 11)
+                assert db["Town-1"].population == 1
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    try:
+        threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+    assert errors == []
+    assert db.list_in_department(99) == []
+    assert len(db.population_index) == 1000
+
+
+def test_sharded_db(tmp_path):
+    cities = [City(f"Town-{i}", i % 7, "France", i * 37 % 1000) for i in range(200)]
+    db = Db(cities)
+    with ShardedDb(cities, shards=3, batch_size=16) as sharded:
+        assert len(sharded) == 200
+        assert [city.name for city in sharded.list_in_department(4)] == [
+            city.name for city in db.list_in_department(4)]
+        assert [(population, city.name) for population, city in sharded.top(10)] == [
+            (population, city.name) for population, city in db.top(10)]
+        assert sharded.top(3, department=5)[-1][1].name == db.top(3, department=5)[-1][1].name
+
+        # Changing department moves the city to another shard
+        sharded.add(City("Town-1", 2, "France", 5000))
+        assert sharded["Town-1"].department == 2
+        assert "Town-1" not in [city.name for city in sharded.list_in_department(1)]
+        assert sharded.top(1)[0][1].name == "Town-1"
+
+        sharded.delete("2")
+        assert sharded["Town-1"] == "<Not Found>"
+        assert len(sharded) == 200 - 30  # department 2, and Town-1 moved there
+        sharded.delete("Town-3")
+        with pytest.raises(KeyError):
+            sharded.delete("Town-3")
+
+        sharded.flush(str(tmp_path / "db.csv"))
+    assert sorted(os.listdir(tmp_path)) == ["db.csv.0", "db.csv.1", "db.csv.2"]
+
+    with ShardedDb(shards=3, path=str(tmp_path / "db.csv"), sorted_index=True) as reopened:
+        assert len(reopened) == 200 - 31
+        assert reopened.list_in_department(2) == []
+        assert reopened["Town-4"].population == 148
@@ -0,0 +1,231 @@
+import contextlib
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from correction.catalog import Catalog, OrderBatch
+from correction.engine import process_orders
+from correction.factory import ProductFactory
+from correction.order import Order
+from generator import generate_orders, generate_orders_jsonl, load_menu, save_orders
+
+
+def bench_totals(n: int = 200_000, k: int = 10):
+    with open("menu.json", "r") as fp:
+        menu_as_json = json.load(fp)
+    random.seed(0)
+    commands = generate_orders(menu_as_json, n, k)
+
+    # Ancienne version de main.py : un Order de Product par commande
+    t0 = time.perf_counter()
+    factory = ProductFactory()
+    menu = {}
+    for product_as_json in menu_as_json["boissons"] + menu_as_json["pizzas"]:
+        product = factory.create(product_as_json)
+        menu[product.name()] = product
+    totals = []
+    for command in commands:
+        order = Order(command["commande_id"])
+        for item in command["items"]:
+            order.add(menu[item])
+        totals.append(order.total())
+    objects = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    catalog = Catalog.compile(menu_as_json)
+    batch = OrderBatch.from_commands(catalog, commands)
+    encode = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    vectorized = catalog.totals(batch)
+    total = time.perf_counter() - t0
+
+    assert all(abs(a - b) < 1e-6 for a, b in zip(totals, vectorized))
+    print(f"{n} orders: Product objects {objects:.3f}s, "
+          f"catalog encode {encode:.3f}s + totals {total * 1000:.1f} ms")
+
+
+def bench_generate(n: int = 200_000, k: int = 10):
+    menu = load_menu("menu.json")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "commandes")
+
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        save_orders(generate_orders(menu, n, k), path + ".json")
+        elapsed = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"list + json.dump: {elapsed:.2f}s, peak {peak / 2 ** 20:.1f} MiB, "
+              f"{os.path.getsize(path + '.json') / 2 ** 20:.1f} MiB written")
+
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        generate_orders_jsonl(menu, n, k, path + ".jsonl", seed=0, processes=1)
+        elapsed = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"jsonl, 1 process: {elapsed:.2f}s, peak {peak / 2 ** 20:.1f} MiB, "
+              f"{os.path.getsize(path + '.jsonl') / 2 ** 20:.1f} MiB written")
+
+        t0 = time.perf_counter()
+        generate_orders_jsonl(menu, n, k, path + ".jsonl", seed=0)
+        print(f"jsonl, {os.cpu_count()} processes: {time.perf_counter() - t0:.2f}s")
+
+
+def bench_engine(n: int = 500_000, k: int = 10):
+    menu_as_json = load_menu("menu.json")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "commandes.jsonl")
+        generate_orders_jsonl(menu_as_json, n, k, path, seed=0)
+
+        # Ancienne version de main.py : tout le fichier en mémoire, un Order et un print par commande
+        t0 = time.perf_counter()
+        factory = ProductFactory()
+        menu = {}
+        for product_as_json in menu_as_json["boissons"] + menu_as_json["pizzas"]:
+            product = factory.create(product_as_json)
+            menu[product.name()] = product
+        with open(path, encoding="utf-8") as fp:
+            commands = [json.loads(line) for line in fp]
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for command in commands:
+                order = Order(command["commande_id"])
+                for item in command["items"]:
+                    order.add(menu[item])
+                print(order.order_id, order.total())
+        del commands
+        print(f"Order per command: {n / (time.perf_counter() - t0):.0f} orders/s")
+
+        catalog = Catalog.compile(menu_as_json)
+        for processes in (1, None):
+            t0 = time.perf_counter()
+            process_orders(catalog, path, processes=processes)
+            print(f"process_orders processes={processes}: {n / (time.perf_counter() - t0):.0f} orders/s")
+
+
+# Les produits avant __slots__ : un __dict__ par instance, et une liste d'ingrédients par pizza
+class DictProduct:
+    def __init__(self, name: str, price: float):
+        self._name = name
+        self._price = price
+
+    def price(self):
+        return self._price
+
+    def name(self):
+        return self._name
+
+
+class DictDrink(DictProduct):
+    def __init__(self, name: str, price: float, volume: int):
+        super().__init__(name, price)
+
+
+class DictPizza(DictProduct):
+    def __init__(self, name: str, price: float):
+        super().__init__(name, price)
+        self.items = []
+
+    def add_ingredient(self, ingredient: str):
+        self.items.append(ingredient)
+
+
+def create_with_match(a_dict: dict):
+    # ProductFactory.create avant le cache par schéma : un match complet par dict
+    match a_dict:
+        case {"nom": name, "volume": volume, "prix": prix}:
+            return DictDrink(name, prix, volume)
+        case {"nom": name, "prix": prix, "garnitures": items}:
+            pizza = DictPizza(name, prix)
+            for item in items:
+                pizza.add_ingredient(item)
+            return pizza
+
+
+def bench_factory(repeat: int = 20_000):
+    menu_as_json = load_menu("menu.json")
+    records = (menu_as_json["boissons"] + menu_as_json["pizzas"]) * repeat
+
+    t0 = time.perf_counter()
+    [create_with_match(record) for record in records]
+    print(f"match per dict: {len(records) / (time.perf_counter() - t0):.0f} products/s")
+    factory = ProductFactory()
+    t0 = time.perf_counter()
+    [factory.create(record) for record in records]
+    print(f"create, cached schema: {len(records) / (time.perf_counter() - t0):.0f} products/s")
+    t0 = time.perf_counter()
+    factory.create_many(records)
+    print(f"create_many: {len(records) / (time.perf_counter() - t0):.0f} products/s")
+
+
+def bench_memory(n: int = 200_000, k: int = 10):
+    menu_as_json = load_menu("menu.json")
+    menu = {product["nom"]: product for product in menu_as_json["boissons"] + menu_as_json["pizzas"]}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "commandes.json")
+        random.seed(0)
+        save_orders(generate_orders(menu_as_json, n, k), path)
+
+        for description, create in (("a product per item", create_with_match),
+                                     ("shared flyweights", ProductFactory().create)):
+            with open(path, "r") as fp:
+                commands = json.load(fp)
+            tracemalloc.start()
+            orders = []
+            for command in commands:
+                order = Order(command["commande_id"])
+                for item in command["items"]:
+                    order.add(create(menu[item]))
+                orders.append(order)
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del orders, commands
+            print(f"{n} orders, {description}: {size / 2 ** 20:.1f} MiB")
+
+
+class SumOrder:
+    # Order avant les agrégats incrémentaux : total() refait la somme à chaque appel
+    def __init__(self, order_id: int):
+        self.order_id = order_id
+        self.items = []
+
+    def add(self, item):
+        self.items.append(item)
+
+    def total(self):
+        return sum(item.price() for item in self.items)
+
+
+def bench_order(size: int = 2_000, repeat: int = 20):
+    menu_as_json = load_menu("menu.json")
+    products, _ = ProductFactory().create_many(menu_as_json["boissons"] + menu_as_json["pizzas"])
+    random.seed(0)
+    items = random.choices(products, k=size)
+
+    # Comme l'interface : le total est relu après chaque ajout
+    for order_class in (SumOrder, Order):
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            order = order_class(1)
+            for item in items:
+                order.add(item)
+                order.total()
+        elapsed = (time.perf_counter() - t0) / repeat
+        print(f"{order_class.__name__}, total after each of {size} adds: {elapsed * 1000:.2f} ms")
+
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        Order(1).add_many(items)
+    print(f"Order.add_many of {size} items: {(time.perf_counter() - t0) / repeat * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    bench_totals()
+    bench_generate()
+    bench_engine()
+    bench_factory()
+    bench_memory()
+    bench_order()
@@ -0,0 +1,115 @@
+import json
+import os
+from array import array
+from collections.abc import Iterable
+
+try:
+    import numpy as np
+except ImportError:  # sans numpy, les totaux sont calculés en Python pur
+    np = None
+
+
+class Catalog:
+    """
+    Menu compilé : chaque produit reçoit un identifiant, son index dans names et prices.
+    Le résultat est mis en cache à côté du menu, et recompilé quand le menu change.
+    """
+
+    def __init__(self, names: list[str], prices: array):
+        self.names = names
+        self.prices = prices
+        self.ids = {name: product_id for product_id, name in enumerate(names)}
+
+    @classmethod
+    def compile(cls, menu: dict) -> "Catalog":
+        names = []
+        prices = array("d")
+        for product in menu["boissons"] + menu["pizzas"]:
+            names.append(product["nom"])
+            prices.append(product["prix"])
+        return cls(names, prices)
+
+    @classmethod
+    def load(cls, menu_path: str, cache_path: str = None) -> "Catalog":
+        """
+        Le cache est un simple fichier JSON (rien n'y est exécuté à la lecture). Un cache illisible
+        est recompilé, et un cache qui ne peut pas être écrit n'empêche pas de charger le menu.
+        """
+        cache_path = cache_path or menu_path + ".catalog"
+        stat = os.stat(menu_path)
+        source = [stat.st_mtime_ns, stat.st_size]
+        try:
+            with open(cache_path, "r", encoding="utf-8") as fp:
+                cached = json.load(fp)
+            if cached["source"] == source:
+                return cls([str(name) for name in cached["names"]], array("d", cached["prices"]))
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        with open(menu_path, "r") as fp:
+            catalog = cls.compile(json.load(fp))
+        try:
+            # Écrit à côté puis renommé : un autre processus ne lit jamais un cache à moitié écrit
+            with open(cache_path + ".tmp", "w", encoding="utf-8") as fp:
+                json.dump({"source": source, "names": catalog.names, "prices": catalog.prices.tolist()}, fp)
+            os.replace(cache_path + ".tmp", cache_path)
+        except OSError:
+            pass
+        return catalog
+
+    def encode(self, items: Iterable[str]) -> array:
+        return array("H", map(self.ids.__getitem__, items))
+
+    def price(self, name: str) -> float:
+        return self.prices[self.ids[name]]
+
+    def totals(self, batch: "OrderBatch"):
+        """Le total de chaque commande du lot, en une seule passe sur tous les produits commandés."""
+        if np is None:
+            prices = self.prices
+            return [sum(prices[product_id] for product_id in batch.product_ids[start:end])
+                    for start, end in zip(batch.offsets, batch.offsets[1:])]
+
+        item_prices = np.asarray(self.prices)[np.frombuffer(batch.product_ids, dtype=np.uint16)]
+        lengths = np.diff(np.frombuffer(batch.offsets, dtype=np.int64))
+        owners = np.repeat(np.arange(len(lengths)), lengths)
+        return np.bincount(owners, weights=item_prices, minlength=len(lengths))
+
+    def counts(self, batch: "OrderBatch"):
+        """Le nombre de ventes de chaque produit dans le lot, indexé par identifiant."""
+        if np is None:
+            counts = [0] * len(self.names)
+            for product_id in batch.product_ids:
+                counts[product_id] += 1
+            return counts
+        return np.bincount(np.frombuffer(batch.product_ids, dtype=np.uint16), minlength=len(self.names))
+
+    def __len__(self):
+        return len(self.names)
+
+
+class OrderBatch:
+    """
+    Commandes stockées à plat : les identifiants de produits de toutes les commandes se
+    suivent dans product_ids, ceux de la commande i vont de offsets[i] à offsets[i + 1].
+    """
+
+    def __init__(self):
+        self.order_ids = array("q")
+        self.product_ids = array("H")
+        self.offsets = array("q", [0])
+
+    @classmethod
+    def from_commands(cls, catalog: Catalog, commands: Iterable[dict]) -> "OrderBatch":
+        batch = cls()
+        for command in commands:
+            batch.add(command["commande_id"], catalog.encode(command["items"]))
+        return batch
+
+    def add(self, order_id: int, product_ids: array):
+        self.order_ids.append(order_id)
+        self.product_ids.extend(product_ids)
+        self.offsets.append(len(self.product_ids))
+
+    def __len__(self):
+        return len(self.order_ids)
@@ -1,5 +1,14 @@
 from .product import Product
 
 class Drink(Product):
+    __slots__ = ("_volume",)
+
     def __init__(self, name: str, price: float, volume: int):
         super().__init__(name, price)
+        object.__setattr__(self, "_volume", volume)
+
+    def __reduce__(self):
+        return Drink.shared, (self._name, self._price, self._volume)
+
+    def volume(self):
+        return self._volume
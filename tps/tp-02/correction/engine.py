@@ -0,0 +1,115 @@
+import json
+import multiprocessing
+import os
+from array import array
+from collections import deque
+from collections.abc import Iterable
+from itertools import islice
+
+from .catalog import Catalog, OrderBatch
+
+# Nombre de lignes JSON envoyées à un processus à la fois
+CHUNK_SIZE = 20_000
+
+
+class OrderSummary:
+    """Agrégats d'un ensemble de commandes, fusionnables d'un processus à l'autre."""
+
+    def __init__(self, products: int):
+        self.orders = 0
+        self.items = 0
+        self.unknown_items = 0
+        self.revenue = 0.0
+        self.largest = 0.0
+        self.counts = [0] * products
+
+    def add_batch(self, catalog: Catalog, batch: OrderBatch):
+        if not len(batch):
+            return
+        totals = catalog.totals(batch)
+        self.orders += len(batch)
+        self.items += len(batch.product_ids)
+        self.revenue += float(sum(totals))
+        self.largest = max(self.largest, float(max(totals)))
+        self.counts = [a + int(b) for a, b in zip(self.counts, catalog.counts(batch))]
+
+    def merge(self, other: "OrderSummary"):
+        self.orders += other.orders
+        self.items += other.items
+        self.unknown_items += other.unknown_items
+        self.revenue += other.revenue
+        self.largest = max(self.largest, other.largest)
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+
+    def report(self, catalog: Catalog, top: int = 5) -> str:
+        lines = [
+            f"Commandes : {self.orders}",
+            f"Articles : {self.items} ({self.unknown_items} inconnus ignorés)",
+            f"Chiffre d'affaires : {self.revenue:.2f} euros",
+            f"Panier moyen : {self.revenue / self.orders if self.orders else 0:.2f} euros",
+            f"Plus grosse commande : {self.largest:.2f} euros",
+            "Meilleures ventes :",
+        ]
+        best = sorted(range(len(self.counts)), key=self.counts.__getitem__, reverse=True)[:top]
+        for product_id in best:
+            revenue = self.counts[product_id] * catalog.prices[product_id]
+            lines.append(f"  {catalog.names[product_id]} : {self.counts[product_id]} vendus, {revenue:.2f} euros")
+        return "\n".join(lines)
+
+
+def summarize(catalog: Catalog, lines: Iterable[str]) -> OrderSummary:
+    """
+    Décode des lignes JSON Lines et les agrège ; les lignes vides sont sautées, les produits
+    absents du menu sont comptés et ignorés.
+    """
+    summary = OrderSummary(len(catalog))
+    batch = OrderBatch()
+    for line in lines:
+        if not line.strip():  # par exemple un saut de ligne final en trop
+            continue
+        command = json.loads(line)
+        product_ids = array("H", (catalog.ids[item] for item in command["items"] if item in catalog.ids))
+        summary.unknown_items += len(command["items"]) - len(product_ids)
+        batch.add(command["commande_id"], product_ids)
+    summary.add_batch(catalog, batch)
+    return summary
+
+
+# Catalogue de chaque processus, transmis une fois à son démarrage
+_catalog: Catalog | None = None
+
+
+def init_worker(names: list[str], prices: array):
+    global _catalog
+    _catalog = Catalog(names, prices)
+
+
+def summarize_chunk(lines: list[str]) -> OrderSummary:
+    return summarize(_catalog, lines)
+
+
+def process_orders(catalog: Catalog, file_path: str, processes: int = None,
+                   chunk_size: int = CHUNK_SIZE) -> OrderSummary:
+    """
+    Agrège un fichier de commandes JSON Lines. Les lignes sont lues par paquets de chunk_size,
+    décodées et agrégées par un pool de processus, puis les résultats partiels sont fusionnés.
+    """
+    summary = OrderSummary(len(catalog))
+    with open(file_path, "r", encoding="utf-8") as file:
+        chunks = iter(lambda: list(islice(file, chunk_size)), [])
+        if processes == 1:
+            for chunk in chunks:
+                summary.merge(summarize(catalog, chunk))
+            return summary
+
+        # Au plus in_flight paquets lus en avance
+        in_flight = 2 * (processes or os.cpu_count() or 1)
+        with multiprocessing.Pool(processes, initializer=init_worker, initargs=(catalog.names, catalog.prices)) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.apply_async(summarize_chunk, (chunk,)))
+                if len(pending) >= in_flight:
+                    summary.merge(pending.popleft().get())
+            while pending:
+                summary.merge(pending.popleft().get())
+    return summary
@@ -1,15 +1,88 @@
+from collections.abc import Callable, Iterable
+from operator import itemgetter
+
 from .product import Product
 from .drink import Drink
 from .pizza import Pizza
 
 
+def create_drink(a_dict: dict) -> Drink:
+    return Drink.shared(a_dict["nom"], a_dict["prix"], a_dict["volume"])
+
+
+def create_pizza(a_dict: dict) -> Pizza:
+    return Pizza.shared(a_dict["nom"], a_dict["prix"], tuple(a_dict["garnitures"]))
+
+
+def build_drinks(dicts: list[dict]) -> list[Drink]:
+    return list(map(Drink.shared, map(itemgetter("nom"), dicts), map(itemgetter("prix"), dicts),
+                    map(itemgetter("volume"), dicts)))
+
+
+def build_pizzas(dicts: list[dict]) -> list[Pizza]:
+    return list(map(Pizza.shared, map(itemgetter("nom"), dicts), map(itemgetter("prix"), dicts),
+                    map(tuple, map(itemgetter("garnitures"), dicts))))
+
+
+# Pour chaque constructeur, sa version qui construit une liste de dicts colonne par colonne
+BUILDERS: dict[Callable[[dict], Product], Callable[[list[dict]], list[Product]]] = {
+    create_drink: build_drinks,
+    create_pizza: build_pizzas,
+}
+
+
 class ProductFactory:
-    def create(self, a_dict: dict) -> Product:
+    """
+    Le constructeur d'un dict est choisi d'après ses clés : le choix est fait une fois par
+    schéma (la suite des clés du dict), puis mis en cache pour tous les dicts de même forme.
+    """
+
+    def __init__(self):
+        self.constructors: dict[tuple, Callable[[dict], Product] | None] = dict()
+
+    def resolve(self, a_dict: dict) -> Callable[[dict], Product] | None:
         match a_dict:
-            case {"nom": name, "volume": volume, "prix": prix}:
-                return Drink(name, prix, volume)
-            case {"nom": name, "taille": taille, "garnitures": items}:
-                pizza = Pizza(name, taille)
-                for item in items:
-                    pizza.add_ingredient(item)
-                return pizza
+            case {"nom": _, "volume": _, "prix": _}:
+                constructor = create_drink
+            case {"nom": _, "prix": _, "garnitures": _}:
+                constructor = create_pizza
+            case _:
+                constructor = None
+        self.constructors[tuple(a_dict)] = constructor
+        return constructor
+
+    def create(self, a_dict: dict) -> Product | None:
+        try:
+            constructor = self.constructors[tuple(a_dict)]
+        except KeyError:
+            constructor = self.resolve(a_dict)
+        return constructor(a_dict) if constructor is not None else None
+
+    def create_many(self, dicts: Iterable[dict]) -> tuple[list[Product], list[tuple[int, dict]]]:
+        """
+        Crée les produits par lots de même constructeur, colonne par colonne. Renvoie les produits dans
+        l'ordre des dicts, et les (position, dict) qu'aucun schéma ne reconnaît au lieu de lever une erreur.
+        """
+        groups: dict[Callable, tuple[list[int], list[dict]]] = dict()
+        unmatched = []
+        constructors = self.constructors
+        count = 0
+        for count, a_dict in enumerate(dicts, 1):
+            try:
+                constructor = constructors[tuple(a_dict)]
+            except KeyError:
+                constructor = self.resolve(a_dict)
+            if constructor is None:
+                unmatched.append((count - 1, a_dict))
+                continue
+            positions, group = groups.setdefault(constructor, ([], []))
+            positions.append(count - 1)
+            group.append(a_dict)
+
+        products: list[Product | None] = [None] * count
+        for constructor, (positions, group) in groups.items():
+            for position, product in zip(positions, BUILDERS[constructor](group)):
+                products[position] = product
+        if unmatched:
+            products = [product for product in products if product is not None]
+        return products, unmatched
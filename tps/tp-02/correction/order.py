@@ -1,13 +1,110 @@
+from collections import Counter
+from collections.abc import Iterable
+
 from .product import Product
 
 
+def cents(price: float) -> int:
+    return round(price * 100)
+
+
 class Order:
+    """
+    Le total et le nombre d'articles sont mis à jour à chaque modification : les lire est en O(1),
+    quelle que soit la taille de la commande. Tant qu'on ne fait qu'y ajouter des produits, la
+    commande garde une simple liste ; les quantités par produit et les sous-totaux par catégorie
+    ne sont construits qu'au premier besoin, puis tenus à jour eux aussi.
+    Les sommes sont tenues en centimes entiers : ajouter puis retirer un produit ne laisse aucun
+    résidu d'arrondi, ni dans le total ni dans les sous-totaux.
+    """
+
+    __slots__ = ("order_id", "_items", "_counts", "_subtotals", "size", "_total")
+
     def __init__(self, order_id: int):
         self.order_id = order_id
-        self.items = []
+        # Produits ajoutés, jusqu'à ce que _counts soit construit et la remplace
+        self._items: list[Product] | None = []
+        # Produit -> quantité ; les produits partagés (Product.shared) sont comptés ensemble
+        self._counts: dict[Product, int] | None = None
+        # Catégorie -> (nombre d'articles, montant en centimes)
+        self._subtotals: dict[type, tuple[int, int]] | None = None
+        self.size = 0
+        self._total = 0
+
+    @property
+    def counts(self) -> dict[Product, int]:
+        if self._counts is None:
+            self._counts = dict(Counter(self._items))
+            self._items = None
+        return self._counts
+
+    def __category_totals(self) -> dict[type, tuple[int, int]]:
+        if self._subtotals is None:
+            self._subtotals = dict()
+            for item, count in self.counts.items():
+                self.__add_subtotal(type(item), count, cents(item.price()) * count)
+        return self._subtotals
+
+    @property
+    def subtotals(self) -> dict[type, float]:
+        return {category: amount / 100 for category, (_, amount) in self.__category_totals().items()}
+
+    def __add_subtotal(self, category: type, quantity: int, amount: int):
+        size, subtotal = self._subtotals.get(category, (0, 0))
+        if size + quantity:
+            self._subtotals[category] = (size + quantity, subtotal + amount)
+        else:
+            # Plus aucun article de cette catégorie
+            self._subtotals.pop(category, None)
+
+    def __update(self, item: Product, quantity: int):
+        if quantity > 0 and self._items is not None:
+            self._items.extend([item] * quantity)
+        else:
+            counts = self.counts
+            count = counts.get(item, 0) + quantity
+            if count < 0:
+                raise ValueError(f"{item.name()} is only {count - quantity} times in order {self.order_id}")
+            if count:
+                counts[item] = count
+            else:
+                counts.pop(item, None)
+        self.size += quantity
+        amount = cents(item.price()) * quantity
+        self._total += amount
+        if self._subtotals is not None:
+            self.__add_subtotal(type(item), quantity, amount)
+
+    def add(self, item: Product, quantity: int = 1):
+        self.__update(item, quantity)
+
+    def add_many(self, items: Iterable[Product]):
+        """Ajoute un lot de produits, les agrégats sont mis à jour une fois par produit distinct."""
+        for item, quantity in Counter(items).items():
+            self.__update(item, quantity)
+
+    def remove(self, item: Product, quantity: int = 1):
+        if item not in self.counts:
+            raise KeyError(item.name())
+        self.__update(item, -quantity)
+
+    def set_quantity(self, item: Product, quantity: int):
+        self.__update(item, quantity - self.counts.get(item, 0))
+
+    def quantity(self, item: Product) -> int:
+        return self.counts.get(item, 0)
+
+    def subtotal(self, category: type) -> float:
+        return self.__category_totals().get(category, (0, 0))[1] / 100
+
+    @property
+    def items(self) -> list[Product]:
+        if self._items is not None:
+            return list(self._items)
+        return [item for item, count in self._counts.items() for _ in range(count)]
 
-    def add(self, item: Product):
-        self.items.append(item)
+    def total(self) -> float:
+        return self._total / 100
 
-    def total(self) -> int:
-        return sum(map(Product.price, self.items))
\ No newline at end of file
+    def __len__(self):
+        return self.size
@@ -1,9 +1,27 @@
+import sys
+from collections.abc import Iterable
+
 from .product import Product
 
+# Listes d'ingrédients déjà vues, partagées par toutes les pizzas qui ont les mêmes
+INGREDIENTS: dict[tuple[str, ...], tuple[str, ...]] = dict()
+
+
+def intern_ingredients(ingredients: Iterable[str]) -> tuple[str, ...]:
+    ingredients = tuple(map(sys.intern, ingredients))
+    return INGREDIENTS.setdefault(ingredients, ingredients)
+
+
 class Pizza(Product):
-    def __init__(self, name: str, price: float):
+    __slots__ = ("items",)
+
+    def __init__(self, name: str, price: float, ingredients: Iterable[str] = ()):
         super().__init__(name, price)
-        self.items = []
+        object.__setattr__(self, "items", intern_ingredients(ingredients))
+
+    def __reduce__(self):
+        return Pizza.shared, (self._name, self._price, self.items)
 
-    def add_ingredient(self, ingredient: str):
-        self.items.append(ingredient)
\ No newline at end of file
+    def with_ingredient(self, ingredient: str) -> "Pizza":
+        """La pizza est immuable : renvoie une nouvelle pizza avec l'ingrédient en plus."""
+        return Pizza(self._name, self._price, self.items + (ingredient,))
@@ -1,10 +1,38 @@
 class Product:
+    """
+    Produit immuable et sans __dict__. shared() renvoie une instance unique par valeur :
+    les commandes référencent les mêmes produits au lieu d'en garder chacune une copie.
+    """
+
+    __slots__ = ("_name", "_price")
+
+    # (classe, arguments) -> instance partagée
+    _shared: dict[tuple, "Product"] = dict()
+
     def __init__(self, name: str, price: float):
-        self._name = name
-        self._price = price
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_price", price)
+
+    @classmethod
+    def shared(cls, *args):
+        key = (cls, *args)
+        product = Product._shared.get(key)
+        if product is None:
+            product = Product._shared[key] = cls(*args)
+        return product
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        # Recréé via shared : une copie envoyée à un autre processus y reste partagée
+        return type(self).shared, (self._name, self._price)
 
     def price(self):
         return self._price
 
     def name(self):
-        return self._name
\ No newline at end of file
+        return self._name
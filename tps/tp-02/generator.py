@@ -1,5 +1,14 @@
+import io
 import json
+import math
+import multiprocessing
+import os
 import random
+from collections import deque
+from itertools import islice
+
+# Nombre de commandes écrites d'un coup, et générées par tâche en parallèle
+CHUNK_SIZE = 10_000
 
 # Charger le fichier menu.json
 def load_menu(file_path="menu.json"):
@@ -8,15 +17,15 @@ def load_menu(file_path="menu.json"):
     return menu
 
 # Générer une commande aléatoire
-def generate_random_order(menu, k):
+def generate_random_order(menu, k, rng=random):
     order = []
-    num_items = random.randint(1, k)  # Entre 1 et k items par commande
+    num_items = rng.randint(1, k)  # Entre 1 et k items par commande
     for _ in range(num_items):
         # Choisir aléatoirement entre pizza ou boisson
-        item_type = random.choice(['pizzas', 'boissons'])
+        item_type = rng.choice(['pizzas', 'boissons'])
         if item_type in menu:
             # Choisir un item aléatoire parmi les options disponibles
-            item = random.choice(menu[item_type])
+            item = rng.choice(menu[item_type])
             order.append(item["nom"])
     return order
 
@@ -33,13 +42,73 @@ def save_orders(orders, file_path="commandes.json"):
     with open(file_path, "w") as file:
         json.dump(orders, file, indent=4)
 
+# Générer les commandes start à start + n - 1 une par une, sans les garder en mémoire
+def iter_orders(menu, n, k, start=1, rng=random):
+    for i in range(start, start + n):
+        yield {"commande_id": i, "items": generate_random_order(menu, k, rng)}
+
+# Écrire des commandes au format JSON Lines dans buffer, vidé puis réutilisé à chaque appel
+def dump_orders(orders, buffer):
+    buffer.seek(0)
+    buffer.truncate()
+    for order in orders:
+        buffer.write(json.dumps(order, ensure_ascii=False, separators=(",", ":")))
+        buffer.write("\n")
+    return buffer.getvalue()
+
+# Sauvegarder un flux de commandes en JSON Lines, par paquets de chunk_size
+def save_orders_jsonl(orders, file_path="commandes.jsonl", chunk_size=CHUNK_SIZE):
+    buffer = io.StringIO()
+    orders = iter(orders)
+    with open(file_path, "w", encoding="utf-8") as file:
+        while chunk := list(islice(orders, chunk_size)):
+            file.write(dump_orders(chunk, buffer))
+
+# Buffer de chaque processus, réutilisé d'un bloc à l'autre
+_buffer = io.StringIO()
+
+# Générer un bloc de commandes, avec une graine propre au bloc : le résultat ne dépend pas du processus
+def generate_block(menu, k, seed, block, start, count):
+    rng = random.Random(f"{seed}:{block}")
+    return dump_orders(iter_orders(menu, count, k, start, rng), _buffer)
+
+# Générer n commandes dans un fichier JSON Lines, par blocs de chunk_size répartis sur plusieurs processus.
+# Le fichier est le même pour une graine donnée quel que soit processes, et la mémoire ne dépend pas de n.
+def generate_orders_jsonl(menu, n, k, file_path="commandes.jsonl", seed=None, processes=None,
+                          chunk_size=CHUNK_SIZE):
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    blocks = ((block, 1 + block * chunk_size, min(chunk_size, n - block * chunk_size))
+              for block in range(math.ceil(n / chunk_size)))
+    with open(file_path, "w", encoding="utf-8") as file:
+        if processes == 1:
+            for block in blocks:
+                file.write(generate_block(menu, k, seed, *block))
+            return
+
+        # Au plus in_flight blocs en attente d'écriture
+        in_flight = 2 * (processes or os.cpu_count() or 1)
+        with multiprocessing.Pool(processes) as pool:
+            pending = deque()
+            for block in blocks:
+                pending.append(pool.apply_async(generate_block, (menu, k, seed, *block)))
+                if len(pending) >= in_flight:
+                    file.write(pending.popleft().get())
+            while pending:
+                file.write(pending.popleft().get())
+
+# Relire un fichier JSON Lines commande par commande
+def read_orders(file_path="commandes.jsonl"):
+    with open(file_path, "r", encoding="utf-8") as file:
+        for line in file:
+            yield json.loads(line)
+
 # Main Function
 if __name__ == "__main__":
     n = int(input("Entrez le nombre de commandes à générer : "))
     k = int(input("Entrez le nombre maximum d'items par commande : "))
 
     menu = load_menu("menu.json")
-    orders = generate_orders(menu, n, k)
-    save_orders(orders, "commandes.json")
+    generate_orders_jsonl(menu, n, k, "commandes.jsonl")
 
-    print(f"{n} commandes ont été générées et sauvegardées dans 'commandes.json'.")
+    print(f"{n} commandes ont été générées et sauvegardées dans 'commandes.jsonl'.")
@@ -1,30 +1,14 @@
-import json
+import time
 
-from correction.factory import ProductFactory
-from correction.order import Order
-from correction.product import Product
+from correction.catalog import Catalog
+from correction.engine import process_orders
 
-menu: dict[str, Product] = dict()
-
-factory = ProductFactory()
-
-with open("menu.json", "r") as fp:
-    menu_as_json = json.load(fp)
-
-for drink in menu_as_json["boissons"]:
-    product: Product = factory.create(drink)
-    menu[product.name()] = product
-
-for pizza in menu_as_json["pizzas"]:
-    product = factory.create(pizza)
-    menu[product.name()] = product
-
-with open("commandes.json") as fp:
-    for command in json.load(fp):
-        order = Order(command["commande_id"])
-        for item in command["items"]:
-            order.add(menu[item])
-
-        print(order)
+# Compilé une seule fois, puis relu depuis le cache tant que menu.json ne change pas
+catalog = Catalog.load("menu.json")
 
+t0 = time.perf_counter()
+summary = process_orders(catalog, "commandes.jsonl")
+elapsed = time.perf_counter() - t0
 
+print(summary.report(catalog))
+print(f"{summary.orders} commandes traitées en {elapsed:.2f}s ({summary.orders / elapsed:.0f} commandes/s)")
@@ -0,0 +1,258 @@
+import json
+import os
+import pickle
+from unittest import mock
+
+import pytest
+
+import correction.catalog
+from correction.catalog import Catalog, OrderBatch
+from correction.drink import Drink
+from correction.engine import process_orders
+from correction.factory import ProductFactory
+from correction.order import Order
+from correction.product import Product
+from generator import generate_orders_jsonl, iter_orders, read_orders, save_orders_jsonl
+from correction.pizza import Pizza
+
+MENU = {
+    "boissons": [
+        {"nom": "Coca-Cola", "volume": 500, "prix": 2},
+        {"nom": "Eau", "volume": 500, "prix": 1},
+    ],
+    "pizzas": [
+        {"nom": "Margherita", "taille": "M", "prix": 8.5, "garnitures": ["tomate", "mozzarella"]},
+        {"nom": "Reine", "taille": "M", "prix": 9.5, "garnitures": ["tomate", "mozzarella", "jambon"]},
+    ],
+}
+
+COMMANDS = [
+    {"commande_id": 1, "items": ["Margherita", "Eau"]},
+    {"commande_id": 2, "items": ["Reine", "Reine", "Coca-Cola", "Margherita"]},
+    {"commande_id": 3, "items": []},
+    {"commande_id": 4, "items": ["Eau"]},
+]
+
+
+@pytest.fixture(params=[True, False], ids=["numpy", "python"])
+def use_numpy(request, monkeypatch) -> bool:
+    if request.param:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(correction.catalog, "np", None)
+    return request.param
+
+
+def test_catalog_totals_match_orders(use_numpy):
+    catalog = Catalog.compile(MENU)
+    batch = OrderBatch.from_commands(catalog, COMMANDS)
+
+    factory = ProductFactory()
+    menu = {product.name(): product for product in map(factory.create, MENU["boissons"] + MENU["pizzas"])}
+    expected = []
+    for command in COMMANDS:
+        order = Order(command["commande_id"])
+        for item in command["items"]:
+            order.add(menu[item])
+        expected.append(order.total())
+
+    assert list(catalog.totals(batch)) == expected
+    assert list(catalog.counts(batch)) == [1, 2, 2, 2]  # Coca-Cola, Eau, Margherita, Reine
+
+
+def test_catalog_cache(tmp_path):
+    path = str(tmp_path / "menu.json")
+    with open(path, "w") as fp:
+        json.dump(MENU, fp)
+
+    assert Catalog.load(path).price("Reine") == 9.5
+    assert os.path.exists(path + ".catalog")
+    with mock.patch.object(Catalog, "compile") as compile:
+        assert Catalog.load(path).price("Reine") == 9.5
+        compile.assert_not_called()
+
+    with open(path, "w") as fp:
+        json.dump({**MENU, "pizzas": [{**MENU["pizzas"][1], "prix": 10.5}]}, fp)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    catalog = Catalog.load(path)
+    assert catalog.price("Reine") == 10.5
+    assert "Margherita" not in catalog.ids
+
+
+@pytest.mark.parametrize("content", [b"", b"{", b"[]", b"{}", b'{"source": 1}', b"\x80\x04K\x01.",
+                                     b'{"source": [0, 0], "names": 1, "prices": ["x"]}'])
+def test_catalog_broken_cache(tmp_path, content):
+    path = str(tmp_path / "menu.json")
+    with open(path, "w") as fp:
+        json.dump(MENU, fp)
+    with open(path + ".catalog", "wb") as fp:
+        fp.write(content)
+    assert Catalog.load(path).price("Reine") == 9.5
+    with mock.patch.object(Catalog, "compile") as compile:
+        assert Catalog.load(path).price("Reine") == 9.5
+        compile.assert_not_called()
+
+
+def test_catalog_cache_not_writable(tmp_path):
+    path = str(tmp_path / "menu.json")
+    with open(path, "w") as fp:
+        json.dump(MENU, fp)
+    assert Catalog.load(path, str(tmp_path / "missing" / "menu.catalog")).price("Reine") == 9.5
+    assert os.listdir(tmp_path) == ["menu.json"]
+
+
+def test_process_orders(tmp_path):
+    path = str(tmp_path / "commandes.jsonl")
+    with open(path, "w", encoding="utf-8") as fp:
+        for command in COMMANDS * 10:
+            fp.write(json.dumps(command) + "\n")
+        fp.write(json.dumps({"commande_id": 5, "items": ["Calzone", "Eau"]}) + "\n\n  \n")
+
+    catalog = Catalog.compile(MENU)
+    summary = process_orders(catalog, path, processes=1, chunk_size=7)
+    assert summary.orders == 41
+    assert summary.items == 71
+    assert summary.unknown_items == 1
+    assert summary.revenue == 10 * (9.5 + 29.5 + 1) + 1
+    assert summary.largest == 29.5
+    assert summary.counts == [10, 21, 20, 20]
+
+    pooled = process_orders(catalog, path, processes=2, chunk_size=7)
+    assert vars(pooled) == vars(summary)
+
+
+def test_factory_create_many():
+    factory = ProductFactory()
+    records = [MENU["pizzas"][0], {"nom": "Calzone"}, MENU["boissons"][1], MENU["pizzas"][1], {}]
+    products, unmatched = factory.create_many(records)
+    assert [product.name() for product in products] == ["Margherita", "Eau", "Reine"]
+    assert unmatched == [(1, records[1]), (4, records[4])]
+    assert products[0] is factory.create(MENU["pizzas"][0])
+
+    assert len(factory.constructors) == 4
+    with mock.patch.object(factory, "resolve") as resolve:
+        factory.create_many(records * 3)
+        resolve.assert_not_called()
+
+
+def test_products_are_immutable():
+    drink = Drink("Eau", 1, 500)
+    pizza = Pizza("Reine", 9.5, ["tomate", "jambon"])
+    for product in (drink, pizza):
+        with pytest.raises(AttributeError):
+            product._price = 0
+        with pytest.raises(AttributeError):
+            del product._name
+        with pytest.raises(AttributeError):
+            product.discount = 0.5
+    assert pizza.with_ingredient("olives").items == ("tomate", "jambon", "olives")
+    assert pizza.items == ("tomate", "jambon")
+
+
+def test_shared_products():
+    assert Drink.shared("Eau", 1, 500) is Drink.shared("Eau", 1, 500)
+    assert Drink.shared("Eau", 1, 500) is not Drink.shared("Eau", 1, 330)
+    assert Pizza.shared("Reine", 9.5, ("tomate", "jambon")) is Pizza.shared("Reine", 9.5, ("tomate", "jambon"))
+
+    # Deux pizzas distinctes aux mêmes ingrédients partagent le même tuple
+    first = Pizza("Reine", 9.5, ["tomate", "jambon"])
+    second = Pizza("Royale", 10.5, iter(["tomate", "jambon"]))
+    assert first.items is second.items
+
+
+def test_products_pickle():
+    drink = Drink.shared("Eau", 1, 500)
+    pizza = Pizza.shared("Reine", 9.5, ("tomate", "jambon"))
+    copy_drink, copy_pizza = pickle.loads(pickle.dumps([drink, pizza]))
+    assert type(copy_drink) is Drink
+    assert (copy_drink.name(), copy_drink.price(), copy_drink.volume()) == ("Eau", 1, 500)
+    assert type(copy_pizza) is Pizza
+    assert (copy_pizza.name(), copy_pizza.price(), copy_pizza.items) == ("Reine", 9.5, ("tomate", "jambon"))
+    assert copy_pizza.items is pizza.items
+    assert copy_drink is drink and copy_pizza is pizza
+    assert pickle.loads(pickle.dumps(Drink("Eau", 1, 500))) is drink
+
+
+def test_order():
+    eau, coca = Drink.shared("Eau", 1, 500), Drink.shared("Coca-Cola", 2, 500)
+    reine = Pizza.shared("Reine", 9.5, ("tomate", "jambon"))
+    order = Order(1)
+    assert (len(order), order.total(), order.quantity(eau), order.subtotal(Drink)) == (0, 0, 0, 0)
+
+    order.add(reine)
+    order.add(eau, 3)
+    order.add_many([coca, eau, reine, coca])
+    assert len(order) == 8
+    assert order.total() == 2 * 9.5 + 4 * 1 + 2 * 2
+    assert (order.quantity(eau), order.quantity(coca), order.quantity(reine)) == (4, 2, 2)
+    assert (order.subtotal(Drink), order.subtotal(Pizza)) == (8, 19)
+    assert sorted(order.items, key=Product.name) == [coca] * 2 + [eau] * 4 + [reine] * 2
+
+    order.remove(eau)
+    order.set_quantity(coca, 5)
+    order.add(reine)
+    assert len(order) == 11
+    assert order.total() == 3 * 9.5 + 3 * 1 + 5 * 2
+    assert (order.subtotal(Drink), order.subtotal(Pizza)) == (13, 28.5)
+
+    order.set_quantity(coca, 0)
+    assert coca not in order.items
+    assert order.quantity(coca) == 0
+    with pytest.raises(KeyError):
+        order.remove(coca)
+    with pytest.raises(ValueError):
+        order.remove(eau, 4)
+    assert (len(order), order.quantity(eau)) == (6, 3)
+
+
+def test_order_reset_when_empty():
+    order = Order(1)
+    for price in (0.1, 0.2):
+        order.add(Drink.shared("Eau", price, 500))
+    assert order.subtotal(Drink) == 0.3
+    order.add_many([Pizza.shared("Reine", 9.5, ())] * 2)
+    for price in (0.1, 0.2):
+        order.remove(Drink.shared("Eau", price, 500))
+    order.set_quantity(Pizza.shared("Reine", 9.5, ()), 0)
+    assert (len(order), order.total(), order.subtotal(Drink), order.subtotal(Pizza)) == (0, 0, 0, 0)
+    assert order.items == []
+
+
+def test_order_removes_a_category():
+    order = Order(1)
+    drinks = [Drink.shared("Eau", 0.1, 500), Drink.shared("Coca-Cola", 0.2, 500)]
+    reine = Pizza.shared("Reine", 9.7, ())
+    order.add_many(drinks + [reine])
+    assert order.subtotal(Drink) == 0.3
+    for drink in drinks:
+        order.remove(drink)
+    assert order.subtotals == {Pizza: 9.7}
+    assert order.subtotal(Drink) == 0
+    assert order.total() == 9.7
+    order.add(drinks[0])
+    assert (order.subtotal(Drink), order.total()) == (0.1, 9.8)
+
+
+@pytest.mark.parametrize("n", [0, 7, 20, 23])
+def test_generate_orders_jsonl(tmp_path, n):
+    paths = [str(tmp_path / f"commandes-{processes}.jsonl") for processes in (1, 2)]
+    for path, processes in zip(paths, (1, 2)):
+        generate_orders_jsonl(MENU, n, 4, path, seed=42, processes=processes, chunk_size=5)
+    with open(paths[0], "rb") as first, open(paths[1], "rb") as second:
+        content = first.read()
+        assert content == second.read()
+    assert (content == b"") == (n == 0)
+
+    orders = list(read_orders(paths[0]))
+    assert [order["commande_id"] for order in orders] == list(range(1, n + 1))
+    names = {product["nom"] for product in MENU["boissons"] + MENU["pizzas"]}
+    assert all(1 <= len(order["items"]) <= 4 and names.issuperset(order["items"]) for order in orders)
+
+
+def test_save_orders_jsonl(tmp_path):
+    path = str(tmp_path / "commandes.jsonl")
+    orders = list(iter_orders(MENU, 23, 4))
+    orders[0]["items"].append("Pizza à l'été")
+    save_orders_jsonl(iter(orders), path, chunk_size=5)
+    assert list(read_orders(path)) == orders